@@ -0,0 +1,53 @@
+'''
+Time it takes the bot store to add submissions and to reload its index, e.g. when dcbot restarts.
+python -m checks.bot_store checks that the reloaded store is correct.
+Run with python -m bench.bot_store
+'''
+
+from typing import * # type: ignore
+import hashlib
+import os
+import tempfile
+import time
+
+from depl.bot_store import BotRecord, BotStore
+
+COUNTS = (10, 100, 1000)
+AUTHORS = 20
+
+
+def fill(store: BotStore, directory: str, n: int) -> float:
+    start = time.perf_counter()
+
+    for i in range(n):
+        path = os.path.join(directory, "submission.wasm")
+        data = f"bot {i}".encode()
+
+        with open(path, "wb") as f:
+            f.write(data)
+
+        # every fifth submission is rejected
+        valid = i % 5 != 0
+        store.add(path, BotRecord(hashlib.sha256(data).hexdigest(), f"bot{i}.wasm", str(i % AUTHORS), float(i),
+                                  valid=valid, error=None if valid else "rejected"), move=True)
+
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    print(f"{'bots':>6} {'add us':>8} {'reopen ms':>10}")
+
+    for n in COUNTS:
+        with tempfile.TemporaryDirectory() as directory:
+            store = BotStore(os.path.join(directory, "bots"))
+            add_time = fill(store, directory, n)
+
+            start = time.perf_counter()
+            BotStore(store.path)
+            reopen_time = time.perf_counter() - start
+
+            print(f"{n:>6} {add_time * 1e6:>8.1f} {reopen_time * 1e3:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+'''
+Compares the pairwise scan against the spatial hash broad phase and reports where the hash starts to win.
+Run with python -m bench.broadphase
+'''
+
+from typing import * # type: ignore
+import math
+import random
+import timeit
+
+from depl.game.broadphase import pairwise_pairs, spatial_hash_pairs
+from depl.game.puck import Config
+
+COUNTS = (2, 4, 8, 16, 24, 32, 48, 64, 128, 256, 512)
+
+
+def random_arena(n: int, rng: random.Random) -> List[complex]:
+    # scale the arena with the puck count so the density stays the same as in a 1v1 match
+    radius = math.sqrt(n / 2) * Config().boundary_radius
+    points = []
+
+    for _ in range(n):
+        r = radius * math.sqrt(rng.random())
+        phi = rng.uniform(0, 2 * math.pi)
+        points.append(r * complex(math.cos(phi), math.sin(phi)))
+
+    return points
+
+
+def collisions(points: List[complex], pairs: List[Tuple[int, int]], distance: float) -> List[Tuple[int, int]]:
+    return [(i, j) for i, j in pairs if abs(points[j] - points[i]) <= distance]
+
+
+def main():
+    rng = random.Random(0)
+    distance = Config().puck_radius * 2
+    crossover = None
+
+    print(f"{'pucks':>6} {'pairwise us':>12} {'hash us':>12}")
+
+    for n in COUNTS:
+        points = random_arena(n, rng)
+
+        assert collisions(points, pairwise_pairs(points), distance) == collisions(points, spatial_hash_pairs(points, distance), distance)
+
+        number = max(1, 20000 // (n * n))
+        pairwise = min(timeit.repeat(lambda: collisions(points, pairwise_pairs(points), distance), number=number, repeat=5)) / number
+        spatial = min(timeit.repeat(lambda: collisions(points, spatial_hash_pairs(points, distance), distance), number=number, repeat=5)) / number
+
+        print(f"{n:>6} {pairwise * 1e6:>12.1f} {spatial * 1e6:>12.1f}")
+
+        if crossover is None and spatial < pairwise:
+            crossover = n
+
+    print(f"spatial hash is faster from {crossover} pucks on")
+
+
+if __name__ == "__main__":
+    main()
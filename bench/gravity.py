@@ -0,0 +1,52 @@
+'''
+Error and speed of the Barnes-Hut gravity solver compared to the direct pairwise sum.
+Run with python -m bench.gravity
+'''
+
+from typing import * # type: ignore
+from dataclasses import replace
+import random
+import time
+
+from depl.game.space_fight import Body, GravityMode, PhysicsSystem, SimConfig
+
+COUNTS = (100, 300, 1000)
+THETAS = (0.25, 0.5, 0.75, 1.0)
+
+
+def random_bodies(n: int, rng: random.Random) -> List[Body]:
+    return [Body(pos=complex(rng.random(), rng.random()), mass=rng.uniform(0.1, 1.0)) for _ in range(n)]
+
+
+def gravity_forces(bodies: List[Body], cfg: SimConfig) -> Tuple[List[complex], float]:
+    phys = PhysicsSystem(cfg)
+
+    for body in bodies:
+        phys.clear_forces(body)
+
+    start = time.perf_counter()
+    phys.apply_gravity(bodies)
+    elapsed = time.perf_counter() - start
+
+    return [body.force for body in bodies], elapsed
+
+
+def main():
+    rng = random.Random(0)
+    direct_cfg = SimConfig(gravity_mode=GravityMode.DIRECT)
+
+    print(f"{'bodies':>6} {'theta':>6} {'time ms':>9} {'mean rel err':>13} {'max rel err':>12}")
+
+    for n in COUNTS:
+        bodies = random_bodies(n, rng)
+        reference, elapsed = gravity_forces(bodies, direct_cfg)
+        print(f"{n:>6} {'direct':>6} {elapsed * 1e3:>9.1f} {0:>13.2e} {0:>12.2e}")
+
+        for theta in THETAS:
+            forces, elapsed = gravity_forces(bodies, replace(direct_cfg, gravity_mode=GravityMode.BARNES_HUT, barnes_hut_theta=theta))
+            errors = [abs(f - r) / abs(r) for f, r in zip(forces, reference)]
+            print(f"{n:>6} {theta:>6} {elapsed * 1e3:>9.1f} {sum(errors) / n:>13.2e} {max(errors):>12.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+'''
+Cost of host calls, comparing send_action registered through the generic trampoline of wasmtime-py
+with the unchecked ctypes callbacks, on a bot that calls send_action many times per tick.
+Run with python -m bench.host_calls
+'''
+
+from typing import * # type: ignore
+import tempfile
+import time
+
+from bench.sandbox_limits import time_updates, write_wat
+from depl.deployer import BotSandbox
+from depl.game.puck import Config, State
+
+CALLS_PER_TICK = (0, 1, 10, 100, 1000)
+MODES = {
+    "trampoline": False,
+    "unchecked": True,
+}
+
+# calls send_action as often as the x position says, with a different action every time
+CHATTY_BOT = '''(module
+  (import "env" "send_action" (func $send_action (param f32 f32)))
+  (memory (export "memory") 1)
+  (func (export "init") (param f32 f32 f32 f32))
+  (func (export "update") (param f32 f32 f32 f32 f32 f32 f32 f32)
+    (local $i i32)
+    (local.set $i (i32.trunc_f32_u (local.get 0)))
+    (block $done (loop $l
+      (br_if $done (i32.eqz (local.get $i)))
+      (call $send_action (f32.convert_i32_u (local.get $i)) (f32.const 0))
+      (local.set $i (i32.sub (local.get $i) (i32.const 1)))
+      (br $l)))))'''
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        chatty = write_wat(directory, "chatty.wasm", CHATTY_BOT)
+        times: Dict[str, List[float]] = {}
+
+        for mode, unchecked in MODES.items():
+            sandbox = BotSandbox(chatty, fuel_per_match=2**62, unchecked_host_calls=unchecked)
+            sandbox.init(Config())
+            times[mode] = []
+
+            for calls in CALLS_PER_TICK:
+                state = State(complex(calls, 0), 0j, 0j, 0j)
+                n = max(50, 20_000 // max(calls, 1))
+                time_updates(sandbox, state, n) # warm up
+                times[mode].append(time_updates(sandbox, state, n))
+
+    print(f"{'calls':>6}" + "".join(f" {mode + ' us':>15} {'per call ns':>12}" for mode in MODES))
+
+    for i, calls in enumerate(CALLS_PER_TICK):
+        row = f"{calls:>6}"
+
+        for mode in MODES:
+            # whatever a tick costs on top of a tick without host calls
+            per_call = f"{(times[mode][i] - times[mode][0]) / calls * 1e9:.0f}" if calls else ""
+            row += f" {times[mode][i] * 1e6:>15.1f} {per_call:>12}"
+
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+'''
+Micro-benchmarks of the hot paths of a match, to decide what to optimize and to catch regressions.
+Every benchmark reports the median and the best time per operation over several repeats.
+Run with python -m bench.micro [-k filter] [--json results.json] [--baseline old.json]
+'''
+
+from __future__ import annotations
+from typing import * # type: ignore
+from dataclasses import dataclass, field
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+
+from depl.deployer import BotSandbox
+from depl.game import util
+from depl.game.puck import Config, Environment, Puck, State
+from depl.game.space_fight import Action, Game, Ship
+
+PUCK_COUNTS = (2, 8, 32, 128)
+BODY_COUNTS = (2, 10, 50, 200)
+TICKS = 60 # simulations are reset to their start every TICKS ticks, so all repeats time the same work
+DT = 1 / 60
+DEFAULT_BOT = "c/simple_rammer.wasm"
+
+
+@dataclass
+class Benchmark:
+    name: str
+    setup: Callable[[], Callable[[], Any]] # returns the function to time
+    params: Dict[str, Any] = field(default_factory=dict)
+    ops: int = 1 # operations per call of the timed function
+
+    @property
+    def id(self) -> str:
+        return self.name + "".join(f"[{key}={value}]" for key, value in self.params.items())
+
+
+@dataclass
+class Result:
+    id: str
+    name: str
+    params: Dict[str, Any]
+    median: float # seconds per operation
+    best: float
+    ops: int # operations timed per repeat
+
+
+### Game logic
+### ### ### ### ### ### ### ### ### ### ### ### ### ###
+def environment_update(pucks: int) -> Callable[[], Any]:
+    rng = random.Random(0)
+    config = Config()
+    # pack the pucks into the arena densely enough that a few of them always collide
+    radius = max(config.boundary_radius, config.puck_radius * pucks ** 0.5)
+    start = [(complex(rng.uniform(-radius, radius), rng.uniform(-radius, radius)) / 2,
+              complex(rng.uniform(-1, 1), rng.uniform(-1, 1))) for _ in range(pucks)]
+    players = [Puck(pos, vel) for pos, vel in start]
+    env = Environment(players, config)
+    actions = {puck: -puck.pos for puck in players}
+
+    def run():
+        for puck, (pos, vel) in zip(players, start):
+            puck.pos, puck.vel = pos, vel
+
+        for _ in range(TICKS):
+            env.update(DT, actions)
+
+    return run
+
+
+def puck_collision() -> Callable[[], Any]:
+    a = Puck(-0.09+0j, 0.5+0.1j)
+    b = Puck(0.09+0.01j, -0.5+0j)
+    return lambda: a.get_velocity_after_collision(b)
+
+
+def game_step(bodies: int) -> Callable[[], Any]:
+    rng = random.Random(0)
+    game = Game()
+    ships = [Ship(pos=complex(rng.random(), rng.random())) for _ in range(bodies)]
+
+    for ship in ships:
+        ship.old_pos = ship.pos
+
+    game.bodies.extend(ships)
+    start = [(ship.pos, ship.rot) for ship in ships]
+    actions = {ship: {Action.FORWARD, Action.LEFT} for ship in ships}
+
+    def run():
+        for ship, (pos, rot) in zip(ships, start):
+            ship.old_pos = ship.pos = pos
+            ship.old_rot = ship.rot = rot
+
+        for _ in range(TICKS):
+            game.step(actions, DT)
+
+    return run
+
+
+def raycast() -> Callable[[], Any]:
+    return lambda: util.raycast(0.5+0.5j, 0.6+0.8j, 0+1j, 1+1j)
+### ### ### ### ### ### ### ### ### ### ### ### ### ###
+
+
+### Sandbox
+### ### ### ### ### ### ### ### ### ### ### ### ### ###
+def sandbox_construction(path: str) -> Callable[[], Any]:
+    BotSandbox(path) # compile outside of the timing, matches only pay for it once per bot
+    return lambda: BotSandbox(path)
+
+
+def sandbox_update(path: str) -> Callable[[], Any]:
+    # the match budget would run out long before the benchmark is done
+    sandbox = BotSandbox(path, fuel_per_match=2**62)
+    sandbox.init(Config())
+    state = State(-0.3+0j, 0j, 0.3+0j, 0j)
+    return lambda: sandbox.update(state)
+### ### ### ### ### ### ### ### ### ### ### ### ### ###
+
+
+def benchmarks(bot: str) -> List[Benchmark]:
+    return [
+        *(Benchmark("Environment.update", lambda n=n: environment_update(n), {"pucks": n}, TICKS) for n in PUCK_COUNTS),
+        Benchmark("Puck.get_velocity_after_collision", puck_collision),
+        *(Benchmark("Game.step", lambda n=n: game_step(n), {"bodies": n}, TICKS) for n in BODY_COUNTS),
+        Benchmark("util.raycast", raycast),
+        Benchmark("BotSandbox.__init__", lambda: sandbox_construction(bot), {"bot": bot}),
+        Benchmark("BotSandbox.update", lambda: sandbox_update(bot), {"bot": bot}),
+    ]
+
+
+def measure(benchmark: Benchmark, repeat: int, min_time: float) -> Result:
+    timer = timeit.Timer(benchmark.setup())
+    # like timeit.autorange, but with a configurable minimum time per repeat
+    number = 1
+
+    while (elapsed := timer.timeit(number)) < min_time:
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+
+    times = [t / (number * benchmark.ops) for t in timer.repeat(repeat, number)]
+    return Result(benchmark.id, benchmark.name, benchmark.params, statistics.median(times), min(times), number * benchmark.ops)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+
+    return f"{seconds / 1e-9:.1f} ns"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="micro-benchmarks of the match hot paths")
+    parser.add_argument("-k", "--filter", default="", help="only run benchmarks whose id contains this")
+    parser.add_argument("--bot", default=DEFAULT_BOT, help="wasm bot used by the sandbox benchmarks")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum seconds per repeat")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results of an earlier --json run to compare against")
+    args = parser.parse_args()
+
+    baseline: Dict[str, float] = {}
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {result["id"]: result["median"] for result in json.load(f)["results"]}
+
+    selected = [b for b in benchmarks(args.bot) if args.filter in b.id]
+    results = []
+
+    print(f"{'benchmark':<50} {'median':>10} {'best':>10} {'change':>8}")
+
+    for benchmark in selected:
+        result = measure(benchmark, args.repeat, args.min_time)
+        results.append(result)
+        change = f"{result.median / baseline[result.id] - 1:+.1%}" if result.id in baseline else ""
+        print(f"{result.id:<50} {format_time(result.median):>10} {format_time(result.best):>10} {change:>8}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "time": time.time(),
+                "commit": git_commit(),
+                "python": sys.version,
+                "platform": platform.platform(),
+                "results": [vars(result) for result in results],
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+'''
+Cost of passing the game state to a bot through update arguments, the HostIo buffer and the observation buffer,
+and how the observation buffer scales with the number of enemies.
+Run with python -m bench.observation
+'''
+
+from typing import * # type: ignore
+import tempfile
+import time
+
+from bench.sandbox_limits import write_wat
+from depl.deployer import BotSandbox
+from depl.game.puck import Config, Environment, Puck
+
+ENEMY_COUNTS = (1, 8, 32, 128)
+TICKS = 20_000
+
+# every bot moves towards the first enemy it is told about
+ARGS_BOT = '''(module
+  (import "env" "send_action" (func $send_action (param f32 f32)))
+  (memory (export "memory") 1)
+  (func (export "init") (param f32 f32 f32 f32))
+  (func (export "update") (param f32 f32 f32 f32 f32 f32 f32 f32)
+    (call $send_action (f32.sub (local.get 4) (local.get 0)) (f32.sub (local.get 5) (local.get 1)))))'''
+
+IO_BOT = '''(module
+  (memory (export "memory") 1)
+  (func (export "init") (param f32 f32 f32 f32))
+  (func (export "update") (param f32 f32 f32 f32 f32 f32 f32 f32))
+  (func (export "io_buffer") (result i32) (i32.const 1024))
+  (func (export "update_io")
+    (f32.store (i32.const 1056) (f32.sub (f32.load (i32.const 1040)) (f32.load (i32.const 1024))))
+    (f32.store (i32.const 1060) (f32.sub (f32.load (i32.const 1044)) (f32.load (i32.const 1028))))))'''
+
+OBSERVATION_BOT = '''(module
+  (memory (export "memory") 1)
+  ;; room for 1024 enemies
+  (data (i32.const 1024) "\\00\\00\\00\\00\\00\\00\\00\\00\\00\\04\\00\\00")
+  (func (export "init") (param f32 f32 f32 f32))
+  (func (export "update") (param f32 f32 f32 f32 f32 f32 f32 f32))
+  (func (export "observation_buffer") (result i32) (i32.const 1024))
+  (func (export "update_observation")
+    (f32.store (i32.const 1024) (f32.sub (f32.load (i32.const 1056)) (f32.load (i32.const 1040))))
+    (f32.store (i32.const 1028) (f32.sub (f32.load (i32.const 1060)) (f32.load (i32.const 1044))))))'''
+
+
+def time_ticks(sandbox: BotSandbox, enemies: int) -> float:
+    pucks = [Puck(complex(i % 16, i // 16) * 0.05) for i in range(enemies + 1)]
+    env = Environment(pucks)
+    me = pucks[0]
+
+    for _ in range(100):
+        sandbox.update_from(env, me)
+
+    start = time.perf_counter()
+
+    for _ in range(TICKS):
+        sandbox.update_from(env, me)
+
+    return (time.perf_counter() - start) / TICKS
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        bots = {
+            "arguments": write_wat(directory, "args.wasm", ARGS_BOT),
+            "io buffer": write_wat(directory, "io.wasm", IO_BOT),
+            "observation": write_wat(directory, "observation.wasm", OBSERVATION_BOT),
+        }
+
+        print(f"{'channel':>12} {'enemies':>8} {'seen':>5} {'tick us':>8}")
+
+        for channel, path in bots.items():
+            sandbox = BotSandbox(path, fuel_per_match=2**62)
+            sandbox.init(Config())
+
+            for enemies in ENEMY_COUNTS:
+                # the other channels only ever see the closest enemy
+                seen = enemies if channel == "observation" else 1
+                print(f"{channel:>12} {enemies:>8} {seen:>5} {time_ticks(sandbox, enemies) * 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
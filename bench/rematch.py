@@ -0,0 +1,61 @@
+'''
+Compares setting up a bot for a rematch from scratch (instantiate + init) against resetting it to its snapshot.
+Run with python -m bench.rematch [bot.wasm ...]
+'''
+
+from typing import * # type: ignore
+import sys
+import time
+
+from depl.deployer import BotSandbox
+from depl.game.puck import Config, State
+
+REPEAT = 200
+TICKS = 600 # ticks played before every reset, so the bot actually has state to restore
+
+
+def play(sandbox: BotSandbox):
+    state = State(0j, 0j, 0.5+0.5j, 0j)
+
+    for _ in range(TICKS):
+        sandbox.update(state)
+
+
+def fresh_setup(path: str, snapshot: bool = False) -> float:
+    total = 0.0
+
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        sandbox = BotSandbox(path)
+        sandbox.init(Config(), snapshot)
+        total += time.perf_counter() - start
+
+    return total / REPEAT
+
+
+def reset_setup(path: str) -> float:
+    sandbox = BotSandbox(path)
+    sandbox.init(Config(), snapshot=True)
+    total = 0.0
+
+    for _ in range(REPEAT):
+        play(sandbox)
+        start = time.perf_counter()
+        sandbox.reset()
+        total += time.perf_counter() - start
+
+    return total / REPEAT
+
+
+def main():
+    paths = sys.argv[1:] or ["c/simple_rammer.wasm"]
+
+    print(f"{'bot':>30} {'fresh us':>10} {'snapshot us':>12} {'reset us':>10}")
+
+    for path in paths:
+        fresh_setup(path) # warm up the module cache and the instance pre
+        print(f"{path[-30:]:>30} {fresh_setup(path) * 1e6:>10.1f} {fresh_setup(path, snapshot=True) * 1e6:>12.1f} {reset_setup(path) * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
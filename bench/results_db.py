@@ -0,0 +1,52 @@
+'''
+Measures how many match results per second the results database can take and how fast its queries are.
+Run with python -m bench.results_db
+'''
+
+from typing import * # type: ignore
+import os
+import random
+import tempfile
+import time
+
+from depl.deployer import SandboxStats
+from depl.game.puck import Config
+from depl.matchmaker import MatchResult
+from depl.results_db import ResultsDB
+
+BOTS = 200
+MATCHES = 100_000
+
+
+def main():
+    rng = random.Random(0)
+    bots = [f"{rng.getrandbits(256):064x}" for _ in range(BOTS)]
+    stats = [SandboxStats(123456, 789, 3600, 0, 131072)] * 2
+    game_config = Config()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = ResultsDB(os.path.join(directory, "results.db"))
+        start = time.perf_counter()
+
+        for _ in range(MATCHES):
+            a, b = rng.sample(bots, 2)
+            result = MatchResult(rng.choice((0, 1, None)), "ring out", rng.randrange(3600), 0.001, 0.1, bot_stats=stats)
+            db.add(a, b, result, game_config, 1 / 60)
+
+        db.flush()
+        elapsed = time.perf_counter() - start
+        print(f"inserted {MATCHES} results in {elapsed:.2f}s, {MATCHES / elapsed:.0f} per second")
+
+        for name, query in (("head to head", lambda: db.head_to_head(bots[0], bots[1])),
+                            ("history", lambda: db.history(bots[0])),
+                            ("leaderboard", lambda: db.leaderboard())):
+            start = time.perf_counter()
+            for _ in range(100):
+                query()
+            print(f"{name:>13}: {(time.perf_counter() - start) * 1e4:.1f}us")
+
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+'''
+Compares the cost of running bots without limits, with fuel metering and with epoch interruption,
+and how quickly a runaway bot is stopped in each mode.
+Run with python -m bench.sandbox_limits
+'''
+
+from typing import * # type: ignore
+import os
+import tempfile
+import time
+import wasmtime
+
+from depl.deployer import BotSandbox
+from depl.game.puck import Config, State
+
+MODES = {
+    "none": dict(fuel=False, epoch=False),
+    "fuel": dict(fuel=True, epoch=False),
+    "epoch": dict(fuel=False, epoch=True),
+}
+
+# spins for the x position interpreted as iteration count, so the state controls how much work a tick is
+BUSY_BOT = '''(module
+  (memory (export "memory") 1)
+  (func (export "init") (param f32 f32 f32 f32))
+  (func (export "update") (param f32 f32 f32 f32 f32 f32 f32 f32)
+    (local $i i32)
+    (local.set $i (i32.trunc_f32_u (local.get 0)))
+    (block $done (loop $l
+      (br_if $done (i32.eqz (local.get $i)))
+      (local.set $i (i32.sub (local.get $i) (i32.const 1)))
+      (br $l)))))'''
+
+LOOPING_BOT = '''(module
+  (memory (export "memory") 1)
+  (func (export "init") (param f32 f32 f32 f32))
+  (func (export "update") (param f32 f32 f32 f32 f32 f32 f32 f32) (loop $l (br $l))))'''
+
+
+def write_wat(directory: str, name: str, wat: str) -> str:
+    path = os.path.join(directory, name)
+
+    with open(path, "wb") as f:
+        f.write(wasmtime.wat2wasm(wat))
+
+    return path
+
+
+def time_updates(sandbox: BotSandbox, state: State, n: int) -> float:
+    start = time.perf_counter()
+
+    for _ in range(n):
+        sandbox.update(state)
+
+    return (time.perf_counter() - start) / n
+
+
+def main():
+    state = State(0j, 0j, 0.5+0.5j, 0j)
+    busy_state = State(100_000+0j, 0j, 0j, 0j)
+
+    with tempfile.TemporaryDirectory() as directory:
+        busy = write_wat(directory, "busy.wasm", BUSY_BOT)
+        looping = write_wat(directory, "looping.wasm", LOOPING_BOT)
+
+        print(f"{'mode':>6} {'rammer us':>10} {'busy loop us':>13} {'runaway ms':>11}")
+
+        for mode, limits in MODES.items():
+            rammer = BotSandbox("c/simple_rammer.wasm", fuel_per_tick=10**9, **limits)
+            rammer.init(Config())
+            rammer_time = time_updates(rammer, state, 20_000)
+
+            spinner = BotSandbox(busy, fuel_per_tick=10**9, deadline_per_tick_ms=1000, **limits)
+            busy_time = time_updates(spinner, busy_state, 200)
+
+            if mode == "none":
+                runaway = "hangs"
+            else:
+                runaway_bot = BotSandbox(looping, **limits)
+                runaway = f"{time_updates(runaway_bot, state, 20) * 1e3:.2f}"
+
+            print(f"{mode:>6} {rammer_time * 1e6:>10.1f} {busy_time * 1e6:>13.1f} {runaway:>11}")
+
+
+if __name__ == "__main__":
+    main()
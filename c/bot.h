@@ -1,18 +1,11 @@
 #pragma once
 
-__attribute__((import_name("send_action")))
-/**
- * @brief Send an action to the host. Only the most recently sent action will be executed at the end of the tick.
- * @details 
- */
-void sendAction(float x_accel, float y_accel);
+#include <stdint.h>
 
-__attribute__((import_name("set_color")))
-/**
- * @brief Sets the color of your puck. All values should be between 0 and 1.
- * @details 
- */
-void setColor(float r, float g, float b);
+// number of enemies that fit into an Observation, the host writes the closest ones if there are more
+#ifndef MAX_OBSERVED_ENEMIES
+#define MAX_OBSERVED_ENEMIES 16
+#endif
 
 typedef struct Config {
     float boundaryRadius;
@@ -26,15 +19,67 @@ typedef struct State {
     float enemyXPos, enemyYPos, enemyXVel, enemyYVel;
 } State;
 
+typedef struct Action {
+    float xAccel, yAccel;
+} Action;
+
+typedef struct PuckState {
+    float xPos, yPos, xVel, yVel;
+} PuckState;
+
+/**
+ * @brief Everything a bot sees in one tick. Define BOT_OBSERVATION before including bot.h to receive it in observe() instead of update().
+ * @details The host writes it directly into the bot's memory. The layout must match OBSERVATION_HEADER in puck.py
+ */
+typedef struct Observation {
+    Action action;
+    uint32_t capacity; // number of entries in enemies
+    uint32_t enemyCount; // number of enemies the host wrote, closest first
+    PuckState self;
+    PuckState enemies[MAX_OBSERVED_ENEMIES];
+} Observation;
+
+/**
+ * @brief Memory shared with the host. The host writes the state here before every tick and reads the action back afterwards.
+ * @details The layout must match STATE_STRUCT followed by ACTION_STRUCT in deployer.py, IO_SIZE bytes in total
+ */
+typedef struct HostIo {
+    State state;
+    Action action;
+} HostIo;
+
+static HostIo _io;
+static int _actionSent;
+
+__attribute__((import_name("send_action")))
+void _hostSendAction(float x_accel, float y_accel);
+
+__attribute__((import_name("set_color")))
+/**
+ * @brief Sets the color of your puck. All values should be between 0 and 1.
+ * @details
+ */
+void setColor(float r, float g, float b);
+
+/**
+ * @brief Send an action to the host. Only the most recently sent action will be executed at the end of the tick.
+ * @details
+ */
+static void sendAction(float x_accel, float y_accel) {
+    _io.action.xAccel = x_accel;
+    _io.action.yAccel = y_accel;
+    _actionSent = 1;
+}
+
 /**
  * @brief Called at the beginning of every match
- * @details This might contain some stuff like initial position, enemy count, 
+ * @details This might contain some stuff like initial position, enemy count,
  */
 void init(Config cfg);
 
 /**
  * @brief Called before every tick. You should call sendAction in here to set your next move.
- * @details 
+ * @details
  */
 void update(State state);
 
@@ -45,8 +90,53 @@ void _init(float boundaryRadius, float puckRadius, float maxPuckAccel, float dam
     init(cfg);
 }
 
+// Fallback for hosts that pass the state as arguments and expect the action through send_action
 __attribute__((export_name("update")))
 void _update(float xPos, float yPos, float xVel, float yVel, float enemyXPos, float enemyYPos, float enemyXVel, float enemyYVel) {
     State state = { xPos, yPos, xVel, yVel, enemyXPos, enemyYPos, enemyXVel, enemyYVel };
+    _actionSent = 0;
     update(state);
-}
\ No newline at end of file
+
+    if(_actionSent)
+        _hostSendAction(_io.action.xAccel, _io.action.yAccel);
+}
+
+__attribute__((export_name("io_buffer")))
+HostIo* _ioBuffer(void) {
+    return &_io;
+}
+
+__attribute__((export_name("update_io")))
+void _updateIo(void) {
+    update(_io.state);
+}
+
+
+#ifdef BOT_OBSERVATION
+static Observation _observation = { .capacity = MAX_OBSERVED_ENEMIES };
+
+/**
+ * @brief Called before every tick instead of update(). You should call sendAction in here to set your next move.
+ * @details
+ */
+void observe(const Observation* observation);
+
+// hosts without observation buffers still call update, which only knows the closest enemy
+void update(State state) {
+    static Observation observation = { .capacity = 1, .enemyCount = 1 };
+    observation.self = (PuckState){ state.xPos, state.yPos, state.xVel, state.yVel };
+    observation.enemies[0] = (PuckState){ state.enemyXPos, state.enemyYPos, state.enemyXVel, state.enemyYVel };
+    observe(&observation);
+}
+
+__attribute__((export_name("observation_buffer")))
+Observation* _observationBuffer(void) {
+    return &_observation;
+}
+
+__attribute__((export_name("update_observation")))
+void _updateObservation(void) {
+    observe(&_observation);
+    _observation.action = _io.action;
+}
+#endif
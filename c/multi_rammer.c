@@ -0,0 +1,40 @@
+// Rams whichever enemy is closest to falling out of the arena. Sees all enemies through the observation buffer
+#define BOT_OBSERVATION
+
+#include "math.h"
+#include "bot.h"
+
+Config config;
+
+void init(Config cfg) {
+    setColor(0.0, 0.5, 1.0);
+    config = cfg;
+}
+
+void observe(const Observation* observation) {
+    const PuckState* target = 0;
+    float targetDist = 0;
+
+    for(uint32_t i = 0; i < observation->enemyCount; i++) {
+        const PuckState* enemy = &observation->enemies[i];
+        float dist = sqrt(enemy->xPos * enemy->xPos + enemy->yPos * enemy->yPos);
+
+        if(target == 0 || dist > targetDist) {
+            target = enemy;
+            targetDist = dist;
+        }
+    }
+
+    if(target == 0)
+        return;
+
+    float xDiff = target->xPos - observation->self.xPos;
+    float yDiff = target->yPos - observation->self.yPos;
+
+    if(xDiff == 0 && yDiff == 0)
+        return;
+
+    float mag = sqrt(xDiff * xDiff + yDiff * yDiff);
+
+    sendAction((xDiff / mag) * config.maxPuckAccel, (yDiff / mag) * config.maxPuckAccel);
+}
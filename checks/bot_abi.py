@@ -0,0 +1,90 @@
+'''
+Checks that the bots in c/ agree with the host on the layout of the memory they share through bot.h. Every bot gets
+the same random states through update() arguments and through its HostIo buffer and has to answer the same both ways,
+which only holds if HostIo matches STATE_STRUCT and ACTION_STRUCT in depl/deployer.py. Bots built with BOT_OBSERVATION
+also get them through their observation buffer, which checks Observation against OBSERVATION_HEADER and
+OBSERVED_PUCK_SIZE in depl/game/puck.py.
+Rebuild the bots with make in c/ first.
+Run with python -m checks.bot_abi
+'''
+
+from typing import * # type: ignore
+import glob
+import random
+import sys
+
+from depl.deployer import BotSandbox
+from depl.game.puck import Config, Environment, Puck, State
+
+BOTS = "c/*.wasm"
+STATES = 1000
+
+
+def random_state(rng: random.Random) -> State:
+    return State(*(complex(rng.uniform(-1, 1), rng.uniform(-1, 1)) for _ in range(4)))
+
+
+def check_io(path: str) -> List[str]:
+    sandbox = BotSandbox(path, fuel_per_match=2**62)
+    sandbox.init(Config())
+
+    if sandbox.wasm_update_io is None:
+        return [f"{path} doesn't export update_io, rebuild it with the current bot.h"]
+
+    rng = random.Random(0)
+
+    for _ in range(STATES):
+        state = random_state(rng)
+        through_io = sandbox.update(state)
+        through_args = sandbox._update_args(state)
+
+        if through_io != through_args:
+            return [f"{path} answered {through_io} through HostIo but {through_args} through arguments for {state}"]
+
+    return []
+
+
+def check_observation(path: str) -> List[str]:
+    sandbox = BotSandbox(path, fuel_per_match=2**62)
+    sandbox.init(Config())
+
+    if sandbox.wasm_update_observation is None:
+        return []
+
+    if sandbox._observation_capacity < 1:
+        return [f"{path} has room for {sandbox._observation_capacity} enemies in its observation buffer"]
+
+    rng = random.Random(0)
+
+    for _ in range(STATES):
+        state = random_state(rng)
+        me, enemy = Puck(state.pos, state.vel), Puck(state.enemy_pos, state.enemy_vel)
+        through_observation = sandbox.update_from(Environment([me, enemy]), me)
+        # without an observation buffer bot.h builds an Observation with one enemy from the arguments
+        through_args = sandbox._update_args(state)
+
+        if through_observation != through_args:
+            return [f"{path} answered {through_observation} through its observation buffer "
+                    f"but {through_args} through arguments for {state}"]
+
+    # more enemies than fit into the buffer are cut off by the host, the bot must cope with a full buffer
+    pucks = [Puck(random_state(rng).pos) for _ in range(sandbox._observation_capacity + 2)]
+    sandbox.update_from(Environment(pucks), pucks[0])
+
+    return []
+
+
+def main():
+    errors = [error for path in sorted(glob.glob(BOTS)) for check in (check_io, check_observation) for error in check(path)]
+
+    for error in errors:
+        print(error)
+
+    if errors:
+        sys.exit(1)
+
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
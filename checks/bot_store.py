@@ -0,0 +1,67 @@
+'''
+Checks that a reopened bot store, e.g. after dcbot restarts, has the same records, latest bots and files as the store
+that wrote its index. Reloading the index used to recurse until it hit the recursion limit.
+Run with python -m checks.bot_store
+'''
+
+from typing import * # type: ignore
+import hashlib
+import os
+import sys
+import tempfile
+
+from depl.bot_store import BotRecord, BotStore
+
+BOTS = 100
+AUTHORS = 5
+
+
+def fill(store: BotStore, directory: str):
+    path = os.path.join(directory, "submission.wasm")
+
+    for i in range(BOTS):
+        data = f"bot {i}".encode()
+
+        with open(path, "wb") as f:
+            f.write(data)
+
+        # every fifth submission is rejected
+        valid = i % 5 != 0
+        store.add(path, BotRecord(hashlib.sha256(data).hexdigest(), f"bot{i}.wasm", str(i % AUTHORS), float(i),
+                                  valid=valid, error=None if valid else "rejected"), move=True)
+
+
+def check_reopen() -> List[str]:
+    errors = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = BotStore(os.path.join(directory, "bots"))
+        fill(store, directory)
+        reopened = BotStore(store.path)
+
+        if reopened.records(valid_only=False) != store.records(valid_only=False):
+            errors.append("the reopened store has different records")
+
+        for author in map(str, range(AUTHORS)):
+            if reopened.latest(author) != store.latest(author):
+                errors.append(f"the reopened store has a different latest bot for author {author}")
+
+        errors += [f"{path} is missing" for path in reopened.paths() if not os.path.exists(path)]
+
+    return errors
+
+
+def main():
+    errors = check_reopen()
+
+    for error in errors:
+        print(error)
+
+    if errors:
+        sys.exit(1)
+
+    print("ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,62 @@
 SUBMIT_CHANNEL: str = 'submit-bot'
-DOWNLOAD_PATH: str = 'download'
\ No newline at end of file
+DOWNLOAD_PATH: str = 'download'
+
+MODULE_CACHE_PATH: str = 'cache/modules'
+MODULE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+
+MATCH_DT: float = 1 / 60
+MATCH_MAX_TICKS: int = 60 * 60
+
+# CPU budget of a bot, measured in wasmtime fuel which is roughly one unit per executed wasm instruction.
+# Epoch interruption enforces wall clock deadlines instead and is cheaper, both can be enabled at once
+# Instantiating a bot and running its init share one budget of SANDBOX_FUEL_PER_INIT and SANDBOX_DEADLINE_PER_INIT_MS
+SANDBOX_FUEL: bool = True
+SANDBOX_EPOCH: bool = False
+SANDBOX_FUEL_PER_INIT: int = 100_000_000
+SANDBOX_FUEL_PER_TICK: int = 1_000_000
+SANDBOX_FUEL_PER_MATCH: int = 1_000_000_000
+# 'skip' keeps the previous action for that tick and restarts the bot, since a call that was cut off halfway can leave
+# it inconsistent, 'forfeit' loses the match
+SANDBOX_TICK_OVERRUN: str = 'skip'
+SANDBOX_EPOCH_INTERVAL_MS: float = 1.0
+SANDBOX_DEADLINE_PER_INIT_MS: float = 1000.0
+SANDBOX_DEADLINE_PER_TICK_MS: float = 10.0
+# register send_action and set_color as raw ctypes callbacks instead of through the generic trampoline of wasmtime-py,
+# which makes host calls several times cheaper. They rely on private parts of wasmtime-py, which is pinned to the
+# tested version in requirements.txt. Turn off if an upgrade breaks them
+SANDBOX_UNCHECKED_HOST_CALLS: bool = True
+
+# resources a single bot may allocate, exceeding the memory limit forfeits the match. The limit is only checked after
+# every call into the bot, so the real hard cap is twice SANDBOX_MAX_MEMORY_BYTES per memory, 128MB by default,
+# see MEMORY_HARD_LIMIT_FACTOR in depl/deployer.py. SANDBOX_MAX_INSTANCES also limits the number of memories
+SANDBOX_MAX_MEMORY_BYTES: int = 64 * 1024 * 1024
+SANDBOX_MAX_TABLE_ELEMENTS: int = 10_000
+SANDBOX_MAX_INSTANCES: int = 1
+
+# warm, initialized sandboxes every tournament worker keeps per submission, see depl/sandbox_pool.py
+SANDBOX_POOL_PER_BOT: int = 2
+SANDBOX_POOL_MAX_BYTES: int = 256 * 1024 * 1024
+
+# submissions are checked in a process pool so that compiling them never blocks the discord client
+SUBMISSION_WORKERS: int = 2
+SUBMISSION_QUEUE_SIZE: int = 100
+SUBMISSION_MAX_PENDING_PER_USER: int = 3
+SUBMISSION_MAX_BYTES: int = 4 * 1024 * 1024
+BOT_STORE_PATH: str = 'bots'
+
+# new bots are placed on the ladder by playing LADDER_PLACEMENT_ROUNDS rounds against the
+# LADDER_PLACEMENT_OPPONENTS bots rated closest to them, see depl/ladder.py
+LADDER_PATH: str = 'ladder'
+LADDER_INITIAL_RATING: float = 1500.0
+LADDER_K: float = 24.0
+LADDER_PROVISIONAL_GAMES: int = 10 # K is doubled for bots with fewer games
+LADDER_PLACEMENT_ROUNDS: int = 3
+LADDER_PLACEMENT_OPPONENTS: int = 4
+
+# Glicko-2 system constant, lower values let the volatility change less between rating periods
+GLICKO_TAU: float = 0.5
+# the tournament stops once every rating deviation is at most this
+GLICKO_STABLE_RD: float = 90.0
+
+RESULTS_DB_PATH: str = 'results.db'
+RESULTS_DB_BATCH_SIZE: int = 500
\ No newline at end of file
@@ -1,13 +1,24 @@
 import discord
+import aiohttp
 import os
+import asyncio
 import config
 import fmt
+import hashlib
 import tempfile
+import time
 
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
 from pathlib import Path
 from dotenv import load_dotenv
 
 from depl import deployer
+from depl.bot_store import BotRecord, BotStore
+from depl.ladder import Ladder
+from depl.tournament import Pairing, Tournament
+from depl.validator import ValidationError, WasmValidator
 
 
 load_dotenv()
@@ -19,35 +30,285 @@ intents.message_content = True
 client = discord.Client(intents=intents)
 
 
+### Submission pipeline
+### ### ### ### ### ### ### ### ### ### ### ### ### ###
+# downloads happen in the event loop, everything that touches wasm runs in a process pool
+# so a slow or malicious module can never block the client
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+@dataclass
+class Submission:
+    message: discord.Message
+    attachment: discord.Attachment
+
+
+submission_queue: asyncio.Queue[Submission] = asyncio.Queue(maxsize=config.SUBMISSION_QUEUE_SIZE)
+pending_per_user: dict[int, int] = {}
+submission_pool: ProcessPoolExecutor | None = None
+submission_workers: list[asyncio.Task] = []
+bot_store = BotStore()
+
+
+def get_submission_pool() -> ProcessPoolExecutor:
+    global submission_pool
+
+    if submission_pool is None:
+        submission_pool = ProcessPoolExecutor(config.SUBMISSION_WORKERS, initializer=deployer.get_linker)
+
+    return submission_pool
+
+
+class RetrySubmission(Exception):
+    '''
+    The submission couldn't be checked for reasons that may not be its fault, it isn't recorded and can be sent again
+    '''
+
+
+async def check_submission(path: str) -> str | None:
+    '''
+    Returns why the submission was rejected, or None if it's valid. Failures that could be transient raise instead,
+    so that only rejections the same bytes would always get are recorded in the bot store.
+    '''
+    global submission_pool
+    loop = asyncio.get_running_loop()
+    pool = get_submission_pool()
+
+    try:
+        return await loop.run_in_executor(pool, deployer.check_submission, path)
+    except BrokenProcessPool:
+        # a worker died and took every check running in the pool with it, not only the one that killed it
+        if submission_pool is pool:
+            submission_pool = None
+
+    # check again in a process of its own, so only the module that kills the worker fails
+    isolated = ProcessPoolExecutor(1, initializer=deployer.get_linker)
+
+    try:
+        return await loop.run_in_executor(isolated, deployer.check_submission, path)
+    except BrokenProcessPool:
+        raise RetrySubmission("the submission crashed the validator")
+    finally:
+        isolated.shutdown(wait=False)
+
+
+async def download_submission(attachment: discord.Attachment, path: str) -> str:
+    '''
+    Streams the attachment to path and validates it on the way, so oversized or invalid modules are dropped
+    as soon as that is known instead of after the whole download. Returns the SHA-256 of the file.
+    '''
+    validator = WasmValidator()
+    digest = hashlib.sha256()
+
+    async with aiohttp.ClientSession() as session:
+        async with session.get(attachment.url) as response:
+            response.raise_for_status()
+
+            with open(path, "wb") as f:
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    validator.feed(chunk)
+                    digest.update(chunk)
+                    f.write(chunk)
+
+    validator.finish()
+    return digest.hexdigest()
+
+
+async def report_existing(channel: discord.abc.Messageable, filename: str, existing: BotRecord):
+    if existing.valid:
+        await channel.send(fmt.success(f"`{filename}` is already in the tournament as `{existing.name}`"))
+    else:
+        await channel.send(fmt.error(f"`{filename}` was already rejected as `{existing.name}`: {existing.error}"))
+
+
+async def process_submission(submission: Submission):
+    attachment = submission.attachment
+    channel = submission.message.channel
+
+    fd, path = tempfile.mkstemp(dir=config.DOWNLOAD_PATH, suffix=".wasm")
+    os.close(fd)
+
+    try:
+        await channel.send(fmt.info(f"downloading submission `{attachment.filename}`"))
+        digest = await download_submission(attachment, path)
+        existing = bot_store.get(digest)
+
+        if existing is not None:
+            await report_existing(channel, attachment.filename, existing)
+            return
+
+        await channel.send(fmt.info(f"verifying `{attachment.filename}`"))
+        error = await check_submission(path)
+
+        author = str(submission.message.author.id)
+        previous = bot_store.latest(author)
+        record = BotRecord(digest, attachment.filename, author, time.time(), valid=error is None, error=error)
+
+        # the same file may have been checked at the same time in another worker, only the first one is placed
+        stored = bot_store.add(path, record, move=True)
+
+        if stored is not record:
+            await report_existing(channel, attachment.filename, stored)
+            return
+
+        if error is None:
+            await channel.send(fmt.success(f"successfully downloaded and verified `{attachment.filename}`"))
+            start_placement(channel, digest, attachment.filename, previous.digest if previous is not None else None)
+        else:
+            await channel.send(fmt.error(f"`{attachment.filename}`: {error}"))
+
+    except ValidationError as e:
+        await channel.send(fmt.error(f"`{attachment.filename}` was rejected: {e}"))
+
+    except RetrySubmission as e:
+        await channel.send(fmt.warning(f"`{attachment.filename}` couldn't be checked: {e}, you can send it again"))
+
+    except Exception as e:
+        # nothing was recorded, so sending the same file again checks it from scratch
+        await channel.send(fmt.error(f"checking `{attachment.filename}` failed: {str(e) or type(e).__name__}, you can send it again"))
+
+    finally:
+        # valid submissions have been moved into the store
+        if os.path.exists(path):
+            os.remove(path)
+
+
+async def submission_worker():
+    while True:
+        submission = await submission_queue.get()
+        author = submission.message.author.id
+
+        try:
+            await process_submission(submission)
+        finally:
+            pending_per_user[author] -= 1
+
+            if pending_per_user[author] == 0:
+                del pending_per_user[author]
+
+            submission_queue.task_done()
+
+
+async def enqueue_submission(message: discord.Message, attachment: discord.Attachment):
+    author = message.author.id
+
+    if pending_per_user.get(author, 0) >= config.SUBMISSION_MAX_PENDING_PER_USER:
+        await message.channel.send(fmt.warning(f"you already have {config.SUBMISSION_MAX_PENDING_PER_USER} submissions waiting, `{attachment.filename}` was ignored"))
+        return
+
+    if attachment.size > config.SUBMISSION_MAX_BYTES:
+        await message.channel.send(fmt.error(f"`{attachment.filename}` is larger than {config.SUBMISSION_MAX_BYTES} bytes"))
+        return
+
+    if submission_queue.full():
+        await message.channel.send(fmt.warning(f"too many submissions at once, please send `{attachment.filename}` again later"))
+        return
+
+    pending_per_user[author] = pending_per_user.get(author, 0) + 1
+    submission_queue.put_nowait(Submission(message, attachment))
+
+    await message.channel.send(fmt.info(f"queued `{attachment.filename}`, position {submission_queue.qsize()}"))
+### ### ### ### ### ### ### ### ### ### ### ### ### ###
+
+
+### Ladder
+### ### ### ### ### ### ### ### ### ### ### ### ### ###
+# placements run one at a time on a thread that dispatches the matches to a process pool,
+# queries only read the ratings the ladder keeps in memory
+
+ladder = Ladder()
+ladder_executor = ThreadPoolExecutor(1)
+placement_tasks: set[asyncio.Task] = set()
+
+
+def place_bot(digest: str, replaces: str | None):
+    ladder.add(digest, replaces)
+    tournament = Tournament(bot_store.paths())
+
+    # all rounds of the placement share the workers, so every round after the first finds them warm
+    with tournament.session() as play_paths:
+        def play(pairings: list[Pairing]):
+            by_path = {Pairing(bot_store.bot_path(p.player_a), bot_store.bot_path(p.player_b)): p for p in pairings}
+
+            for pairing, result in play_paths(list(by_path)):
+                yield by_path[pairing], result
+
+        ladder.place(digest, play)
+
+
+async def place_submission(channel: discord.abc.Messageable, digest: str, name: str, replaces: str | None):
+    try:
+        await asyncio.get_running_loop().run_in_executor(ladder_executor, place_bot, digest, replaces)
+    except Exception as e:
+        await channel.send(fmt.error(f"placing `{name}` on the ladder failed: {e}"))
+        return
+
+    rating = ladder.rating(digest)
+    await channel.send(fmt.info(f"`{name}` is placed at rank {ladder.rank(digest)} with a rating of {rating.rating:.0f}"))
+
+
+def start_placement(channel: discord.abc.Messageable, digest: str, name: str, replaces: str | None):
+    task = asyncio.create_task(place_submission(channel, digest, name, replaces))
+    # the event loop only keeps weak references to tasks
+    placement_tasks.add(task)
+    task.add_done_callback(placement_tasks.discard)
+
+
+def describe(digest: str) -> str:
+    record = bot_store.get(digest)
+    rating = ladder.rating(digest)
+    name = record.name if record is not None else digest[:12]
+
+    return f"#{ladder.rank(digest)} `{name}` by <@{record.author if record is not None else '?'}>: {rating.rating:.0f} ({rating.wins}W {rating.draws}D {rating.losses}L)"
+
+
+async def ladder_command(message: discord.Message, command: list[str]):
+    match command:
+        case ["!top"]:
+            lines = [describe(digest) for digest, _ in ladder.leaderboard(10)]
+            await message.channel.send(fmt.info("ladder\n" + "\n".join(lines)) if lines else fmt.info("the ladder is empty"))
+
+        case ["!rating"]:
+            record = bot_store.latest(str(message.author.id))
+
+            if record is None or ladder.rating(record.digest) is None:
+                await message.channel.send(fmt.warning("you don't have a bot on the ladder yet"))
+            else:
+                await message.channel.send(fmt.info(describe(record.digest)))
+### ### ### ### ### ### ### ### ### ### ### ### ### ###
+
+
 @client.event
 async def on_ready():
     print(f'Logged {client.user}')
 
+    # on_ready fires again after reconnects
+    if not submission_workers:
+        # one task per process so that every worker is kept busy
+        for _ in range(config.SUBMISSION_WORKERS):
+            submission_workers.append(asyncio.create_task(submission_worker()))
+
 
 @client.event
 async def on_message(message: discord.Message):
     if message.author == client.user:
         return
-    
+
+    command = message.content.split()
+
+    if command and command[0] in ("!top", "!rating"):
+        await ladder_command(message, command)
+
     match message.channel.name:
         case config.SUBMIT_CHANNEL:
             for attachment in message.attachments:
                 if Path(attachment.filename).suffix == ".wasm":
-                    await message.channel.send(fmt.info(f"downloading submission `{attachment.filename}`"))
-
-                    try:
-                        with tempfile.NamedTemporaryFile(dir=config.DOWNLOAD_PATH) as f:
-                            await attachment.save(f.name)
-                            deployer.BotSandbox(f.name)
-
-                            
-                        await message.channel.send(fmt.success(f"successfully downloaded and verified `{attachment.filename}`"))
-
-                    except Exception as e:
-                        await message.channel.send(fmt.error(str(e)))
+                    await enqueue_submission(message, attachment)
 
 
     for attachment in message.attachments:
         pass
 
-client.run(TOKEN)
+
+if __name__ == "__main__":
+    client.run(TOKEN)
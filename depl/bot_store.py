@@ -0,0 +1,146 @@
+'''
+Content addressed store of submitted bots
+'''
+
+from typing import * # type: ignore
+from dataclasses import dataclass, asdict
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+import config
+from depl.files import atomic_write
+
+INDEX = "index.json"
+
+
+@dataclass
+class BotRecord:
+    digest: str # SHA-256 of the wasm file
+    name: str # file name it was submitted as
+    author: str
+    submitted: float # unix time of the first submission
+    valid: bool
+    error: Optional[str] = None # why validation failed
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        while chunk := f.read(65536):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+class BotStore:
+    '''
+    Stores every valid submission once at <path>/<first two hex digits>/<digest>.wasm, no matter how often it's submitted.
+    The metadata of all submissions, including rejected ones, is kept in one index file,
+    so looking up a submission or listing all bots never touches the bots themselves.
+    Can be shared between threads.
+    '''
+    def __init__(self, path: str = config.BOT_STORE_PATH):
+        self.path = path
+        self._records: Dict[str, BotRecord] = {}
+        self._latest: Dict[str, BotRecord] = {} # author -> their most recent valid bot
+        self._index_mtime: Optional[int] = None
+        self._lock = threading.RLock()
+
+        os.makedirs(self.path, exist_ok=True)
+        self.refresh()
+
+    def bot_path(self, digest: str) -> str:
+        return os.path.join(self.path, digest[:2], digest + ".wasm")
+
+    def refresh(self):
+        '''
+        Reloads the index if another process changed it
+        '''
+        index = os.path.join(self.path, INDEX)
+
+        with self._lock:
+            try:
+                mtime = os.stat(index).st_mtime_ns
+            except FileNotFoundError:
+                return
+
+            if mtime == self._index_mtime:
+                return
+
+            with open(index) as f:
+                records = json.load(f)
+
+            for record in records.values():
+                # indexes written by older versions also recorded the module cache entry, which was never used
+                record.pop("artifact", None)
+
+            self._records = {digest: BotRecord(**record) for digest, record in records.items()}
+
+            self._latest = {}
+            # records() would call refresh() again, _index_mtime isn't updated yet
+            for record in sorted(self._records.values(), key=lambda r: r.submitted):
+                if record.valid:
+                    self._latest[record.author] = record
+
+            self._index_mtime = mtime
+
+    def get(self, digest: str) -> Optional[BotRecord]:
+        with self._lock:
+            self.refresh()
+            return self._records.get(digest)
+
+    def records(self, valid_only: bool = True) -> List[BotRecord]:
+        with self._lock:
+            self.refresh()
+            return sorted((r for r in self._records.values() if r.valid or not valid_only), key=lambda r: r.submitted)
+
+    def latest(self, author: str) -> Optional[BotRecord]:
+        with self._lock:
+            self.refresh()
+            return self._latest.get(author)
+
+    def paths(self) -> List[str]:
+        '''
+        Paths of all valid bots, oldest submission first
+        '''
+        return [self.bot_path(record.digest) for record in self.records()]
+
+    def add(self, path: str, record: BotRecord, move: bool = False) -> BotRecord:
+        '''
+        Stores the bot at path under record.digest, or only its record if it's invalid.
+        Returns the existing record instead if the same bot was submitted before.
+        '''
+        with self._lock:
+            self.refresh()
+            existing = self._records.get(record.digest)
+
+            if existing is not None:
+                return existing
+
+            if record.valid:
+                target = self.bot_path(record.digest)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+
+                if move:
+                    shutil.move(path, target)
+                else:
+                    shutil.copyfile(path, target)
+
+            self._records[record.digest] = record
+
+            if record.valid:
+                self._latest[record.author] = record
+
+            self._write_index()
+            return record
+
+    def _write_index(self):
+        # readers never see a partial index
+        with atomic_write(os.path.join(self.path, INDEX)) as f:
+            json.dump({digest: asdict(record) for digest, record in self._records.items()}, f)
+
+        self._index_mtime = os.stat(os.path.join(self.path, INDEX)).st_mtime_ns
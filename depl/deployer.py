@@ -1,57 +1,722 @@
 from typing import * # type: ignore
 import tempfile
+import ctypes
 import logging
 import sys
 import math
+import struct
+import threading
+import time
 import wasmtime
 
-from dataclasses import astuple
+from collections import OrderedDict
+from dataclasses import dataclass, astuple
 import depl.game.puck
-from depl.game.puck import State, Config
+from depl.game.puck import State, Config, Environment, Puck
+from depl.game.puck import OBSERVATION_ACTION_OFFSET, OBSERVATION_CAPACITY_OFFSET, OBSERVATION_HEADER, observation_size
+from depl.module_cache import ModuleCache
+from depl.profiler import Profiler, DISABLED, COMPILE, INSTANTIATE, INIT, UPDATE, HOST_CALLBACKS
+from depl.validator import ValidationError, validate_file
+import config
+
+
+_module_cache: Optional[ModuleCache] = None
+
+def get_module_cache() -> ModuleCache:
+    '''
+    Returns the module cache shared by all sandboxes in this process
+    '''
+    global _module_cache
+
+    if _module_cache is None:
+        _module_cache = ModuleCache()
+
+    return _module_cache
+
+
+### Process-wide engines and linkers
+### ### ### ### ### ### ### ### ### ### ### ### ### ###
+# all sandboxes with the same limits share one engine and one linker so that setting up a bot for a new match
+# is only a store + instantiate step. Host functions are store independent, so they are
+# dispatched to whichever sandbox is currently executing wasm on this thread.
+
+MAX_INSTANCE_PRES = 256
+
+
+class _ActiveSandbox(threading.local):
+    sandbox: Optional["BotSandbox"] = None
+
+_active = _ActiveSandbox()
+
+
+class Runtime:
+    '''
+    An engine configured for one combination of limits together with its linker and pre-linked modules
+    '''
+    def __init__(self, fuel: bool, epoch: bool, unchecked_host_calls: bool = config.SANDBOX_UNCHECKED_HOST_CALLS):
+        self.fuel = fuel
+        self.epoch = epoch
+        self.unchecked_host_calls = unchecked_host_calls
+        self.tag = "static-memory" + ("-fuel" if fuel else "") + ("-epoch" if epoch else "")
+
+        cfg = wasmtime.Config()
+        # the io buffer of a bot is accessed through a raw pointer, so linear memory must never be relocated
+        cfg.memory_may_move = False
+        cfg.consume_fuel = fuel
+        cfg.epoch_interruption = epoch
+        self.engine = wasmtime.Engine(cfg)
+
+        self.linker = wasmtime.Linker(self.engine)
+        self.linker.define_wasi()
+
+        send_action_type = wasmtime.FuncType([wasmtime.ValType.f32(), wasmtime.ValType.f32()], [])
+        set_color_type = wasmtime.FuncType([wasmtime.ValType.f32(), wasmtime.ValType.f32(), wasmtime.ValType.f32()], [])
+
+        if unchecked_host_calls:
+            # only touch the private API of wasmtime-py when asked to, so turning this off still works if it changes
+            from wasmtime import _ffi
+            callback = _ffi.wasmtime_func_unchecked_callback_t
+            # the linker refers to the callbacks without owning them
+            self._callbacks = callback(_unchecked_send_action), callback(_unchecked_set_color)
+            _define_unchecked(self.linker, "env", "send_action", send_action_type, self._callbacks[0])
+            _define_unchecked(self.linker, "env", "set_color", set_color_type, self._callbacks[1])
+        else:
+            self.linker.define_func("env", "send_action", send_action_type, _host_send_action, access_caller=False)
+            self.linker.define_func("env", "set_color", set_color_type, _host_set_color, access_caller=False)
+
+        self._instance_pres: "OrderedDict[str, wasmtime.InstancePre]" = OrderedDict()
+
+        if epoch:
+            get_epoch_ticker().add(self.engine)
+
+    def instance_pre(self, path: str, cache: Optional[ModuleCache] = None) -> wasmtime.InstancePre:
+        '''
+        Returns the compiled and pre-linked module for the wasm file at path.
+        The most recently used MAX_INSTANCE_PRES modules are kept in memory.
+        '''
+        cache = cache or get_module_cache()
+
+        with open(path, "rb") as f:
+            wasm = f.read()
+
+        key = cache.key(wasm, self.tag)
+        pre = self._instance_pres.get(key)
+
+        if pre is not None:
+            self._instance_pres.move_to_end(key)
+            return pre
+
+        pre = self.linker.instantiate_pre(cache.load_bytes(self.engine, wasm, self.tag))
+        self._instance_pres[key] = pre
+
+        if len(self._instance_pres) > MAX_INSTANCE_PRES:
+            self._instance_pres.popitem(last=False)
+
+        return pre
+
+
+_runtimes: Dict[Tuple[bool, bool, bool], Runtime] = {}
+
+def get_runtime(fuel: bool = config.SANDBOX_FUEL, epoch: bool = config.SANDBOX_EPOCH,
+                unchecked_host_calls: bool = config.SANDBOX_UNCHECKED_HOST_CALLS) -> Runtime:
+    runtime = _runtimes.get((fuel, epoch, unchecked_host_calls))
+
+    if runtime is None:
+        runtime = _runtimes[fuel, epoch, unchecked_host_calls] = Runtime(fuel, epoch, unchecked_host_calls)
+
+    return runtime
+
+
+def get_engine() -> wasmtime.Engine:
+    return get_runtime().engine
+
+
+def get_linker() -> wasmtime.Linker:
+    return get_runtime().linker
+
+
+def get_instance_pre(path: str, cache: Optional[ModuleCache] = None) -> wasmtime.InstancePre:
+    return get_runtime().instance_pre(path, cache)
+
+
+class EpochTicker:
+    '''
+    Background thread that advances the epoch of every registered engine once per interval.
+    Stores with epoch interruption trap once their deadline, counted in these ticks, has passed.
+    '''
+    def __init__(self, interval_ms: float = config.SANDBOX_EPOCH_INTERVAL_MS):
+        self.interval_ms = interval_ms
+        self._engines: List[wasmtime.Engine] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, engine: wasmtime.Engine):
+        with self._lock:
+            self._engines.append(engine)
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="epoch-ticker", daemon=True)
+                self._thread.start()
+
+    def ticks_for(self, ms: float) -> int:
+        '''
+        Deadline in ticks for a call that may take ms milliseconds. The first tick can arrive at any point
+        of the current interval, so the call is interrupted between ms - interval_ms and ms.
+        '''
+        return max(1, math.ceil(ms / self.interval_ms))
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_ms / 1000):
+            with self._lock:
+                for engine in self._engines:
+                    engine.increment_epoch()
+
+
+_epoch_ticker: Optional[EpochTicker] = None
+
+def get_epoch_ticker() -> EpochTicker:
+    global _epoch_ticker
+
+    if _epoch_ticker is None:
+        _epoch_ticker = EpochTicker()
+
+    return _epoch_ticker
+
+
+# host calls only store their arguments, BotSandbox._call validates and applies the last ones once the bot returns.
+# A bot that calls send_action in a loop costs one attribute store per call instead of a validation
+
+def _host_send_action(x_accel: float, y_accel: float):
+    _active.sandbox._sent_action = x_accel, y_accel
+
+def _host_set_color(r: float, g: float, b: float):
+    _active.sandbox._sent_color = r, g, b
+
+
+# The generic trampoline of wasmtime-py creates a Caller and converts every argument through a Val object.
+# These callbacks are registered with wasmtime_linker_define_func_unchecked instead and read the f32 arguments
+# straight from the raw value array. They must never raise, ctypes would only print the exception and return 0.
+# Runtime wraps them into ctypes callbacks
+
+def _unchecked_send_action(env, caller, args, nargs) -> int:
+    _active.sandbox._sent_action = args[0].f32, args[1].f32
+    return 0
+
+def _unchecked_set_color(env, caller, args, nargs) -> int:
+    _active.sandbox._sent_color = args[0].f32, args[1].f32, args[2].f32
+    return 0
+
+
+def _define_unchecked(linker: wasmtime.Linker, module: str, name: str, ty: wasmtime.FuncType, callback: Any):
+    from wasmtime import _ffi
+    module_bytes = module.encode()
+    name_bytes = name.encode()
+    # the callbacks are kept alive by the runtime that owns the linker, so they need no finalizer
+    no_finalizer = ctypes.CFUNCTYPE(None, ctypes.c_void_p)()
+    error = _ffi.wasmtime_linker_define_func_unchecked(linker.ptr(),
+                                                       ctypes.create_string_buffer(module_bytes), len(module_bytes),
+                                                       ctypes.create_string_buffer(name_bytes), len(name_bytes),
+                                                       ty.ptr(), callback, None, no_finalizer)
+
+    if error:
+        raise wasmtime.WasmtimeError._from_ptr(error)
+### ### ### ### ### ### ### ### ### ### ### ### ### ###
+
+
+### IF YOU MODIFY THESE THEN YOU MUST CHANGE HostIo IN BOT.H
+### ### ### ### ### ### ### ### ### ### ### ### ### ###
+STATE_STRUCT = struct.Struct("<8f")
+ACTION_STRUCT = struct.Struct("<2f")
+IO_SIZE = STATE_STRUCT.size + ACTION_STRUCT.size
+### ### ### ### ### ### ### ### ### ### ### ### ### ###
+
+
+# the store lets linear memory grow to this many times the memory limit, so that growing past the limit succeeds
+# and the host sees it, see _check_memory
+MEMORY_HARD_LIMIT_FACTOR = 2
+
+# granularity in which snapshots compare and restore linear memory
+SNAPSHOT_PAGE_SIZE = 65536
+_ZERO_PAGE = bytes(SNAPSHOT_PAGE_SIZE)
+
+
+class BudgetExceeded(Exception):
+    '''
+    Raised when a bot exceeded its budget for the whole match or for init, or for a tick if overruns forfeit the match
+    '''
+
+
+class MemoryLimitExceeded(BudgetExceeded):
+    '''
+    Raised when a bot needs more linear memory than it is allowed to have
+    '''
+
+
+class DeadlineExceeded(BudgetExceeded):
+    '''
+    Raised when a bot took longer than its wall clock deadline to initialize. Unlike fuel this depends on the load
+    of the machine, so the same bot may pass when it's tried again.
+    '''
+
+
+@dataclass
+class SandboxStats:
+    fuel_used: int = 0
+    max_tick_fuel: int = 0
+    update_calls: int = 0
+    skipped_ticks: int = 0 # ticks where the bot ran out of fuel or time and its previous action was kept
+    peak_memory_bytes: int = 0
+
+
+@dataclass
+class Snapshot:
+    '''
+    State of a sandbox right after init. Pages of linear memory that are all zeros are stored as None.
+    '''
+    config: Config
+    pages: List[Optional[bytes]]
+    globals: List[Any] # values of the mutable exported globals
+    action: complex
+    color: Tuple[float, float, float]
+    fuel_used: int
+    setup_time: float # seconds it took to instantiate and initialize the bot
+    memory_size: int # bytes of linear memory right after init
 
 
 class BotSandbox:
-    def __init__(self, path: str, logger=logging.Logger("dummy")):
+    def __init__(self, path: str, logger=logging.Logger("dummy"), cache: Optional[ModuleCache] = None,
+                 fuel_per_init: int = config.SANDBOX_FUEL_PER_INIT,
+                 fuel_per_tick: int = config.SANDBOX_FUEL_PER_TICK,
+                 fuel_per_match: int = config.SANDBOX_FUEL_PER_MATCH,
+                 tick_overrun: str = config.SANDBOX_TICK_OVERRUN,
+                 deadline_per_init_ms: float = config.SANDBOX_DEADLINE_PER_INIT_MS,
+                 deadline_per_tick_ms: float = config.SANDBOX_DEADLINE_PER_TICK_MS,
+                 fuel: bool = config.SANDBOX_FUEL,
+                 epoch: bool = config.SANDBOX_EPOCH,
+                 max_memory_bytes: int = config.SANDBOX_MAX_MEMORY_BYTES,
+                 max_table_elements: int = config.SANDBOX_MAX_TABLE_ELEMENTS,
+                 max_instances: int = config.SANDBOX_MAX_INSTANCES,
+                 unchecked_host_calls: bool = config.SANDBOX_UNCHECKED_HOST_CALLS,
+                 profiler: Profiler = DISABLED):
         self.path = path
         self.logger = logger
-        self._store = wasmtime.Store()
-        self._linker = wasmtime.Linker(self._store.engine)
-        self._module = wasmtime.Module.from_file(self._store.engine, path)
+        self.profiler = profiler
+        self.fuel_per_init = fuel_per_init
+        self.fuel_per_tick = fuel_per_tick
+        self.fuel_per_match = fuel_per_match
+        self.tick_overrun = tick_overrun
+        self.deadline_per_init_ms = deadline_per_init_ms
+        self.deadline_per_tick_ms = deadline_per_tick_ms
+        self.max_memory_bytes = max_memory_bytes
+        self.max_table_elements = max_table_elements
+        self.max_instances = max_instances
+        self._runtime = get_runtime(fuel, epoch, unchecked_host_calls)
+        # arguments of the last host calls during the current call into the bot, see _host_send_action
+        self._sent_action: Optional[Tuple[float, float]] = None
+        self._sent_color: Optional[Tuple[float, float, float]] = None
+        self._tick_deadline = get_epoch_ticker().ticks_for(deadline_per_tick_ms)
 
-        self._linker.define_wasi()
+        with profiler.phase(COMPILE):
+            self._pre = self._runtime.instance_pre(path, cache)
 
-        send_action_type = wasmtime.FuncType([wasmtime.ValType.f32(), wasmtime.ValType.f32()], [])
-        
-        self._linker.define(self._store, 
-                            "env", 
-                            "send_action", 
-                            wasmtime.Func(self._store, send_action_type, lambda x_accel, y_accel: self._py_set_action(x_accel, y_accel))
-        )
+        self._check_initial_memory()
+        self._snapshot: Optional[Snapshot] = None
 
-        set_color_type = wasmtime.FuncType([wasmtime.ValType.f32(), wasmtime.ValType.f32(), wasmtime.ValType.f32()], [])
-        
-        self._linker.define(self._store, 
-                            "env", 
-                            "set_color", 
-                            wasmtime.Func(self._store, set_color_type, lambda r, g, b: self._py_set_color(r, g, b))
-        )
-
-        self._instance = self._linker.instantiate(self._store, self._module)
-        self.wasm_init = self._instance.exports(self._store)["init"]
-        self.wasm_update = self._instance.exports(self._store)["update"]
+        with profiler.phase(INSTANTIATE):
+            self._instantiate()
+
+    def _instantiate(self):
+        start = time.perf_counter()
+        self.stats = SandboxStats()
+        self._last_fuel_used = 0
+        self._trapped = False
+        self._size_at_reset: Optional[int] = None
+        # instantiating, setting up the buffers and init share one budget, see _call_init
+        self._init_fuel_left = self.fuel_per_init
+        self._init_ends_at = start + self.deadline_per_init_ms / 1000
+        self._store = wasmtime.Store(self._runtime.engine)
+        # growing tables beyond these fails inside the bot, e.g. malloc returns NULL.
+        # Memory may grow past max_memory_bytes, _check_memory forfeits the bot once it does
+        self._store.set_limits(memory_size=self.max_memory_bytes * MEMORY_HARD_LIMIT_FACTOR,
+                               table_elements=self.max_table_elements,
+                               instances=self.max_instances,
+                               memories=self.max_instances,
+                               tables=self.max_instances)
+        self._memory = None
+        self._memories: List[wasmtime.Memory] = []
+
+        self._instance = self._call_init(self._pre.instantiate)
+
+        exports = self._instance.exports(self._store)
+        memory = exports.get("memory")
+        self._memory = memory if isinstance(memory, wasmtime.Memory) else None
+        self._memories = [m for m in exports.values() if isinstance(m, wasmtime.Memory)]
+        self._globals = [g for g in exports.values() if isinstance(g, wasmtime.Global) and g.type(self._store).mutable]
+        self.wasm_init = exports["init"]
+        self.wasm_update = exports["update"]
+        self.wasm_update_io = None
+        self._io = None
+        self.wasm_update_observation = None
+        self._observation = None
+        self._observation_capacity = 0
         self.action = 0+0j
         self.color = 1.0, 1.0, 1.0
+
+        self._setup_io(exports)
+        self._setup_observation(exports)
+        self._instantiate_time = time.perf_counter() - start
+
+    def _check_initial_memory(self):
+        for export in self._pre.module.exports:
+            if isinstance(export.type, wasmtime.MemoryType):
+                size = export.type.limits.min * export.type.page_size
+
+                if size > self.max_memory_bytes:
+                    raise MemoryLimitExceeded(f"{self.path} starts with {size} bytes of memory, the limit is {self.max_memory_bytes}")
+
+    def _check_memory(self, cause: Optional[BaseException] = None):
+        '''
+        Raises MemoryLimitExceeded if the bot grew its memory past max_memory_bytes. A refused memory.grow isn't
+        reported to the host, it only returns -1 inside the bot, which then fails in some unrelated way. So the store
+        allows growing up to MEMORY_HARD_LIMIT_FACTOR times the limit and the actual size is compared with the limit
+        after every call instead. Only a single grow from below the limit to beyond the hard limit is still refused silently.
+        Only exported memories can be checked, the validator rejects modules with memories that aren't exported.
+        '''
+        for memory in self._memories:
+            size = memory.data_len(self._store)
+
+            if size > self.max_memory_bytes:
+                # memory can't shrink again, so the sandbox must not be reused
+                self._trapped = True
+                raise MemoryLimitExceeded(f"{self.path} grew its memory to {size} bytes, the limit is {self.max_memory_bytes}") from cause
+
+    def collect_stats(self) -> SandboxStats:
+        '''
+        Returns the statistics of this sandbox. Linear memory never shrinks, so its current size is the peak.
+        After a reset, memory that was grown in earlier matches stays, so unless the bot grew it further
+        the peak of this match is taken to be the size right after init.
+        '''
+        if self._memory is not None:
+            size = self._memory.data_len(self._store)
+
+            if size == self._size_at_reset:
+                size = self._snapshot.memory_size
+
+            self.stats.peak_memory_bytes = size
+
+        return self.stats
+
+    def memory_footprint(self) -> int:
+        '''
+        Bytes held by this sandbox: its linear memory plus the snapshot, if any
+        '''
+        size = self._memory.data_len(self._store) if self._memory is not None else 0
+
+        if self._snapshot is not None:
+            size += sum(len(page) for page in self._snapshot.pages if page is not None)
+
+        return size
+
+    def _setup_io(self, exports):
+        '''
+        Bots built against a recent bot.h export a HostIo buffer, which lets update() pass the state and receive
+        the action through linear memory instead of arguments and the send_action callback.
+        Older bots only export update(float...) and keep using that.
+        '''
+        io_buffer = exports.get("io_buffer")
+        update_io = exports.get("update_io")
+        memory = self._memory
+
+        if not isinstance(io_buffer, wasmtime.Func) or not isinstance(update_io, wasmtime.Func) or memory is None:
+            return
+
+        address = self._call_init(io_buffer)
+
+        if not isinstance(address, int) or address < 0 or address + IO_SIZE > memory.data_len(self._store):
+            self.logger.error(f"Bot exported an invalid io_buffer address {address}, falling back to update(float...)")
+            return
+
+        self._io = memory.get_buffer_ptr(self._store, IO_SIZE, address)
+        self.wasm_update_io = update_io
         
-    def init(self, config: Config):
-        self.wasm_init(self._store, *astuple(config))
+    def _setup_observation(self, exports):
+        '''
+        Bots that define BOT_OBSERVATION before including bot.h export an Observation buffer. The environment writes
+        the bot's puck and all enemies, closest first, directly into it before every tick, see Environment.write_observation.
+        The bot chooses how many enemies fit by setting the capacity, the host only checks that the buffer lies in memory.
+        '''
+        observation_buffer = exports.get("observation_buffer")
+        update_observation = exports.get("update_observation")
+        memory = self._memory
+
+        if not isinstance(observation_buffer, wasmtime.Func) or not isinstance(update_observation, wasmtime.Func) or memory is None:
+            return
+
+        address = self._call_init(observation_buffer)
+        size = memory.data_len(self._store)
+
+        if not isinstance(address, int) or address < 0 or address + OBSERVATION_HEADER.size > size:
+            self.logger.error(f"Bot exported an invalid observation_buffer address {address}")
+            return
+
+        header = memory.get_buffer_ptr(self._store, OBSERVATION_HEADER.size, address)
+        capacity = struct.unpack_from("<I", header, OBSERVATION_CAPACITY_OFFSET)[0]
+
+        if address + observation_size(capacity) > size:
+            self.logger.error(f"Bot's observation buffer at {address} with room for {capacity} enemies doesn't fit into its memory")
+            return
+
+        # memory never moves, so the buffer stays valid when the bot grows its memory
+        self._observation = memory.get_buffer_ptr(self._store, observation_size(capacity), address)
+        self._observation_capacity = capacity
+        self.wasm_update_observation = update_observation
+
+    def _call(self, fuel: int, deadline: int, func: Callable, *args):
+        '''
+        Calls func(store, *args) with this sandbox receiving host calls, at most fuel to spend
+        and deadline epoch ticks to finish, depending on which limits the runtime enforces
+        '''
+        previous, _active.sandbox = _active.sandbox, self
+        metered = self._runtime.fuel
+
+        if metered:
+            self._store.set_fuel(fuel)
+
+        if self._runtime.epoch:
+            self._store.set_epoch_deadline(deadline)
+
+        try:
+            result = func(self._store, *args)
+        except wasmtime.Trap as e:
+            self._trapped = True
+            self._check_memory(e)
+            raise
+        finally:
+            _active.sandbox = previous
+            # host calls of a call that failed are dropped, e.g. a skipped tick keeps the previous action
+            action, color = self._sent_action, self._sent_color
+            self._sent_action = self._sent_color = None
+
+            if metered:
+                self._last_fuel_used = fuel - self._store.get_fuel()
+                self.stats.fuel_used += self._last_fuel_used
+
+        self._check_memory()
+
+        if action is not None or color is not None:
+            self.profiler.start(HOST_CALLBACKS)
+
+            if action is not None:
+                self._py_set_action(*action)
+
+            if color is not None:
+                self._py_set_color(*color)
+
+            self.profiler.stop()
+
+        return result
+
+    def _call_init(self, func: Callable, *args):
+        '''
+        Calls into the bot during setup, with whatever is left of the fuel and time
+        that the current instance got for instantiation and init together
+        '''
+        deadline = get_epoch_ticker().ticks_for((self._init_ends_at - time.perf_counter()) * 1000)
+
+        try:
+            return self._call(self._init_fuel_left, deadline, func, *args)
+        except wasmtime.Trap as e:
+            if e.trap_code == wasmtime.TrapCode.OUT_OF_FUEL:
+                raise BudgetExceeded(f"{self.path} used more than {self.fuel_per_init} fuel during initialization") from e
+
+            if e.trap_code == wasmtime.TrapCode.INTERRUPT:
+                raise DeadlineExceeded(f"{self.path} took longer than {self.deadline_per_init_ms}ms to initialize") from e
+
+            raise
+        finally:
+            self._init_fuel_left -= self._last_fuel_used
+
+    def _call_update(self, func: Callable, *args) -> bool:
+        '''
+        Runs one tick of the bot. Returns False if the bot ran out of fuel or time and the tick was skipped.
+        '''
+        fuel = max(0, min(self.fuel_per_tick, self.fuel_per_match - self.stats.fuel_used))
+        self.stats.update_calls += 1
+
+        try:
+            self._call(fuel, self._tick_deadline, func, *args)
+        except wasmtime.Trap as e:
+            if e.trap_code not in (wasmtime.TrapCode.OUT_OF_FUEL, wasmtime.TrapCode.INTERRUPT):
+                raise
+
+            if self._runtime.fuel and self.stats.fuel_used >= self.fuel_per_match:
+                raise BudgetExceeded(f"{self.path} used up its fuel for the match") from e
+
+            if self.tick_overrun == "forfeit":
+                raise BudgetExceeded(f"{self.path} exceeded its budget for one tick") from e
+
+            self.stats.skipped_ticks += 1
+        else:
+            return True
+        finally:
+            self.stats.max_tick_fuel = max(self.stats.max_tick_fuel, self._last_fuel_used)
+
+        self._restart()
+        return False
+
+    def _restart(self):
+        '''
+        A call that ran out of fuel or time stopped halfway, which can leave state the host doesn't know about
+        inconsistent, e.g. the stack pointer of C bots drifts with every skipped tick. So the bot is instantiated
+        and initialized again and plays on from there, keeping its action and the stats of the match.
+        '''
+        stats, action, color = self.stats, self.action, self.color
+
+        with self.profiler.phase(INSTANTIATE):
+            self._instantiate()
+
+        with self.profiler.phase(INIT):
+            self._call_init(self.wasm_init, *astuple(self._config))
+
+        self.stats, self.action, self.color = stats, action, color
+
+    def init(self, config: Config, snapshot: bool = False):
+        '''
+        Runs the init of the bot. With snapshot, its state afterwards is kept for reset(). Taking the snapshot reads
+        all of linear memory, which costs a few milliseconds for bots that reserve large memories.
+        '''
+        start = time.perf_counter()
+        self._config = config
+
+        with self.profiler.phase(INIT):
+            self._call_init(self.wasm_init, *astuple(config))
+
+        setup_time = self._instantiate_time + time.perf_counter() - start
+
+        self._snapshot = self._take_snapshot(config, setup_time) if snapshot else None
+        self._restore_time = 0.0
+
+    def reset(self):
+        '''
+        Puts the bot back into its state right after init for a rematch, without instantiating and initializing it again.
+        Only linear memory and exported globals can be restored. Other globals, like the stack pointer of C bots,
+        are back at their initial value whenever the bot returns normally, but not after a trap,
+        so a bot that trapped since init is instantiated and initialized from scratch instead.
+        The same happens when restoring turned out to be slower than that, e.g. for bots with huge memories and a cheap init.
+        '''
+        snapshot = self._snapshot
+
+        if snapshot is None:
+            raise RuntimeError("reset() needs the bot to be initialized with snapshot=True")
+
+        if self._trapped or self._restore_time > snapshot.setup_time:
+            with self.profiler.phase(INSTANTIATE):
+                self._instantiate()
+
+            with self.profiler.phase(INIT):
+                self._call_init(self.wasm_init, *astuple(snapshot.config))
+
+            return
+
+        start = time.perf_counter()
+
+        if self._memory is not None:
+            self._restore_memory(snapshot.pages)
+
+        for g, value in zip(self._globals, snapshot.globals):
+            g.set_value(self._store, value)
+
+        self.action = snapshot.action
+        self.color = snapshot.color
+        self.stats = SandboxStats(fuel_used=snapshot.fuel_used)
+        self._size_at_reset = self._memory.data_len(self._store) if self._memory is not None else None
+        self._restore_time = time.perf_counter() - start
+
+    def _take_snapshot(self, config: Config, setup_time: float) -> Snapshot:
+        pages = []
+        size = 0
+
+        if self._memory is not None:
+            size = self._memory.data_len(self._store)
+            base = ctypes.addressof(self._memory.get_buffer_ptr(self._store, size, 0))
+
+            for offset in range(0, size, SNAPSHOT_PAGE_SIZE):
+                page = ctypes.string_at(base + offset, min(SNAPSHOT_PAGE_SIZE, size - offset))
+                pages.append(None if page == _ZERO_PAGE[:len(page)] else page)
+
+        return Snapshot(config, pages, [g.value(self._store) for g in self._globals],
+                        self.action, self.color, self.stats.fuel_used, setup_time, size)
+
+    def _restore_memory(self, pages: List[Optional[bytes]]):
+        '''
+        Only writes the pages that differ from the snapshot. Comparing is about as fast as copying, but pages the bot
+        never touched stay untouched, so they aren't committed by the OS. Memory that was grown after the snapshot
+        can't be given back and is zeroed instead.
+        '''
+        size = self._memory.data_len(self._store)
+        base = ctypes.addressof(self._memory.get_buffer_ptr(self._store, size, 0))
+
+        for i, offset in enumerate(range(0, size, SNAPSHOT_PAGE_SIZE)):
+            length = min(SNAPSHOT_PAGE_SIZE, size - offset)
+            page = pages[i] if i < len(pages) else None
+            expected = _ZERO_PAGE[:length] if page is None else page
+
+            if ctypes.string_at(base + offset, length) != expected:
+                ctypes.memmove(base + offset, expected, length)
 
     def update(self, state: State):
+        self.profiler.start(UPDATE)
+
+        try:
+            if self._io is not None:
+                return self._update_io(state)
+
+            return self._update_args(state)
+        finally:
+            self.profiler.stop()
+
+    def update_from(self, env: Environment, puck: Puck) -> complex:
+        '''
+        Runs one tick of the bot controlling puck. Bots with an observation buffer get the observation written
+        straight into their memory, all others get env.state(puck) through update()
+        '''
+        if self._observation is None:
+            return self.update(env.state(puck))
+
+        self.profiler.start(UPDATE)
+
+        try:
+            env.write_observation(puck, self._observation, self._observation_capacity)
+
+            if self._call_update(self.wasm_update_observation):
+                self._py_set_action(*ACTION_STRUCT.unpack_from(self._observation, OBSERVATION_ACTION_OFFSET))
+
+            return self.action
+        finally:
+            self.profiler.stop()
+
+    def _update_args(self, state: State):
         pos = state.pos.real, state.pos.imag
         vel = state.vel.real, state.vel.imag
         enemy_pos = state.enemy_pos.real, state.enemy_pos.imag
         enemy_vel = state.enemy_vel.real, state.enemy_vel.imag
-        
-        self.wasm_update(self._store, *pos, *vel, *enemy_pos, *enemy_vel)
+
+        self._call_update(self.wasm_update, *pos, *vel, *enemy_pos, *enemy_vel)
+        return self.action
+
+    def _update_io(self, state: State):
+        STATE_STRUCT.pack_into(self._io, 0,
+                               state.pos.real, state.pos.imag,
+                               state.vel.real, state.vel.imag,
+                               state.enemy_pos.real, state.enemy_pos.imag,
+                               state.enemy_vel.real, state.enemy_vel.imag)
+
+        if self._call_update(self.wasm_update_io):
+            self._py_set_action(*ACTION_STRUCT.unpack_from(self._io, STATE_STRUCT.size))
 
         return self.action
 
@@ -74,6 +739,25 @@ class BotSandbox:
         self.color = r, g, b
 
 
+def check_submission(path: str) -> Optional[str]:
+    '''
+    Checks that the bot at path passes validation, compiles, instantiates and initializes within its budget
+    with the default game config. Returns None if it does, otherwise why
+    it was rejected. Only rejections that the same bytes would get again are returned, everything else, like failing
+    to write the module cache or missing a wall clock deadline on a busy machine, is raised so the caller can retry.
+    Meant to run in a worker process, so rejections are returned as strings rather than raised.
+    '''
+    try:
+        validate_file(path)
+        BotSandbox(path).init(Config())
+    except DeadlineExceeded:
+        raise
+    except (ValidationError, BudgetExceeded, wasmtime.WasmtimeError, wasmtime.Trap) as e:
+        return str(e) or type(e).__name__
+
+    return None
+
+
 if __name__ == "__main__":
     default_config = Config()
     s = BotSandbox("c/simple_rammer.wasm")
@@ -0,0 +1,30 @@
+'''
+Writing files that other processes read at the same time
+'''
+
+from typing import * # type: ignore
+from contextlib import contextmanager
+import os
+import tempfile
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = "w") -> Generator[IO, None, None]:
+    '''
+    Opens a temporary file next to path, which replaces path once the block finished without an exception.
+    Readers see either the old or the new file but never a partial one, even if the writer crashes.
+    '''
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except FileNotFoundError:
+            pass
+
+        raise
@@ -0,0 +1,126 @@
+'''
+Barnes-Hut quadtree for approximating the pairwise attraction between many bodies in O(n log n)
+'''
+
+from __future__ import annotations
+from typing import * # pyright: ignore[reportWildcardImportFromLibrary]
+
+EPS = 1e-5
+MAX_DEPTH = 32 # bodies that are still in the same cell at this depth are kept together in one leaf
+
+
+class QuadTree:
+    '''
+    A node covers the square centered at center with side length size. It stores the total mass and
+    the center of mass of everything inside it, leaves additionally store the indices of their bodies.
+    '''
+    __slots__ = ("center", "size", "mass", "com", "children", "bodies")
+
+    def __init__(self, center: complex, size: float):
+        self.center = center
+        self.size = size
+        self.mass = 0.0
+        self.com = 0+0j
+        self.children: Optional[List[Optional[QuadTree]]] = None
+        self.bodies: List[int] = []
+
+    @staticmethod
+    def build(positions: Sequence[complex], masses: Sequence[float]) -> QuadTree:
+        min_x = min(p.real for p in positions)
+        max_x = max(p.real for p in positions)
+        min_y = min(p.imag for p in positions)
+        max_y = max(p.imag for p in positions)
+
+        size = max(max_x - min_x, max_y - min_y, EPS)
+        root = QuadTree(complex((min_x + max_x) / 2, (min_y + max_y) / 2), size * (1 + EPS))
+
+        for i in range(len(positions)):
+            root._insert(i, positions, 0)
+
+        root._summarize(positions, masses)
+        return root
+
+    def contains(self, pos: complex) -> bool:
+        return abs(pos.real - self.center.real) <= self.size / 2 and abs(pos.imag - self.center.imag) <= self.size / 2
+
+    def _quadrant(self, pos: complex) -> int:
+        return (pos.real >= self.center.real) + 2 * (pos.imag >= self.center.imag)
+
+    def _child(self, quadrant: int) -> QuadTree:
+        assert self.children is not None
+        child = self.children[quadrant]
+
+        if child is None:
+            offset = complex(1 if quadrant & 1 else -1, 1 if quadrant & 2 else -1) * self.size / 4
+            child = self.children[quadrant] = QuadTree(self.center + offset, self.size / 2)
+
+        return child
+
+    def _insert(self, i: int, positions: Sequence[complex], depth: int):
+        node = self
+
+        while True:
+            if node.children is None:
+                if not node.bodies or depth >= MAX_DEPTH:
+                    node.bodies.append(i)
+                    return
+
+                # split the leaf and push its body down
+                node.children = [None] * 4
+                for j in node.bodies:
+                    node._child(node._quadrant(positions[j]))._insert(j, positions, depth + 1)
+                node.bodies = []
+
+            node = node._child(node._quadrant(positions[i]))
+            depth += 1
+
+    def _summarize(self, positions: Sequence[complex], masses: Sequence[float]):
+        if self.children is None:
+            self.mass = sum(masses[i] for i in self.bodies)
+            weighted = sum((masses[i] * positions[i] for i in self.bodies), 0+0j)
+        else:
+            self.mass = 0.0
+            weighted = 0+0j
+
+            for child in self.children:
+                if child is None:
+                    continue
+
+                child._summarize(positions, masses)
+                self.mass += child.mass
+                weighted += child.mass * child.com
+
+        self.com = weighted / self.mass if self.mass > 0 else self.center
+
+    def attraction(self, i: int, positions: Sequence[complex], masses: Sequence[float], theta: float) -> complex:
+        '''
+        Sum of mass * (other - pos) / distance^2 over all other bodies as seen from body i.
+        Nodes that appear smaller than theta (size / distance) are treated as a single body at their center of mass.
+        '''
+        pos = positions[i]
+        total = 0+0j
+        stack = [self]
+
+        while stack:
+            node = stack.pop()
+
+            if node.children is None:
+                for j in node.bodies:
+                    if j == i:
+                        continue
+
+                    diff = positions[j] - pos
+                    total += masses[j] * diff / max(abs(diff), EPS)**2
+
+                continue
+
+            diff = node.com - pos
+            dist = abs(diff)
+
+            # a node containing the body itself always has to be opened, otherwise the body would attract itself
+            if node.size < theta * dist and not node.contains(pos):
+                total += node.mass * diff / max(dist, EPS)**2
+            else:
+                stack.extend(child for child in node.children if child is not None)
+
+        return total
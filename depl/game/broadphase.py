@@ -0,0 +1,61 @@
+'''
+Broad phase collision detection, finds the pairs of circles that might touch
+'''
+
+from __future__ import annotations
+from typing import * # pyright: ignore[reportWildcardImportFromLibrary]
+import itertools
+import math
+
+# below this many circles the plain pairwise scan is faster than building the grid, see bench/broadphase.py
+SPATIAL_HASH_MIN_COUNT = 24
+
+# neighbouring cells that are checked from each cell. Only half of the neighbourhood is needed,
+# the other half is covered when the neighbouring cell itself is visited
+_HALF_NEIGHBOURHOOD = ((1, 0), (-1, 1), (0, 1), (1, 1))
+
+
+def pairwise_pairs(points: Sequence[complex]) -> List[Tuple[int, int]]:
+    '''
+    Every pair (i, j) with i < j, without looking at the positions. Cheapest for a handful of points,
+    but the number of pairs grows quadratically.
+    '''
+    return list(itertools.combinations(range(len(points)), 2))
+
+
+def spatial_hash_pairs(points: Sequence[complex], cell_size: float) -> List[Tuple[int, int]]:
+    '''
+    Buckets the points into a uniform grid and only pairs points in the same or adjacent cells.
+    With cell_size at least the collision distance no touching pair is missed.
+    Pairs are (i, j) with i < j in the same order itertools.combinations would produce them.
+    '''
+    grid: Dict[Tuple[int, int], List[int]] = {}
+
+    for i, p in enumerate(points):
+        grid.setdefault((math.floor(p.real / cell_size), math.floor(p.imag / cell_size)), []).append(i)
+
+    pairs = []
+
+    for (x, y), cell in grid.items():
+        pairs.extend(itertools.combinations(cell, 2))
+
+        for dx, dy in _HALF_NEIGHBOURHOOD:
+            other = grid.get((x + dx, y + dy))
+
+            if other is None:
+                continue
+
+            pairs.extend((i, j) if i < j else (j, i) for i in cell for j in other)
+
+    pairs.sort()
+    return pairs
+
+
+def candidate_pairs(points: Sequence[complex], distance: float) -> List[Tuple[int, int]]:
+    '''
+    Pairs of points that might be closer than distance, picking whichever broad phase is faster for the point count
+    '''
+    if len(points) < SPATIAL_HASH_MIN_COUNT:
+        return pairwise_pairs(points)
+
+    return spatial_hash_pairs(points, distance)
@@ -6,9 +6,13 @@ from __future__ import annotations
 from typing import * # pyright: ignore[reportWildcardImportFromLibrary]
 from dataclasses import dataclass, astuple
 from enum import Enum, auto
-import itertools
-import pygame
-import sys
+import cmath
+import functools
+import math
+import random
+import struct
+
+from depl.game.broadphase import candidate_pairs
 
 EPS = 1e-5
 
@@ -32,6 +36,28 @@ class State:
 ### ### ### ### ### ### ### ### ### ### ### ### ### ###
 
 
+### IF YOU MODIFY THESE THEN YOU MUST CHANGE Observation IN BOT.H
+### ### ### ### ### ### ### ### ### ### ### ### ### ###
+# action written by the bot, number of enemies that fit into the bot's buffer, number of enemies written by the host,
+# then the position and velocity of the bot's own puck followed by those of every enemy
+OBSERVATION_HEADER = struct.Struct("<2fII4f")
+OBSERVATION_ACTION_OFFSET = 0
+OBSERVATION_CAPACITY_OFFSET = 8
+OBSERVATION_COUNT_OFFSET = 12
+OBSERVED_PUCK_SIZE = 16
+### ### ### ### ### ### ### ### ### ### ### ### ### ###
+
+
+def observation_size(capacity: int) -> int:
+    return OBSERVATION_HEADER.size + capacity * OBSERVED_PUCK_SIZE
+
+
+@functools.lru_cache(maxsize=None)
+def _observation_struct(enemies: int) -> struct.Struct:
+    # everything the host writes, from the enemy count on
+    return struct.Struct(f"<I{4 + 4 * enemies}f")
+
+
 @dataclass(eq=False)
 class Puck:
     pos: complex
@@ -67,7 +93,9 @@ class Environment:
 
 
     def get_collisions(self) -> Generator[Tuple[Puck, Puck], None, None]:
-        for a, b in itertools.combinations(self.players, 2):
+        for i, j in candidate_pairs([p.pos for p in self.players], self.config.puck_radius * 2):
+            a, b = self.players[i], self.players[j]
+
             if a == b:
                 continue
 
@@ -98,9 +126,43 @@ class Environment:
         for puck, action in actions.items():
             self.apply_action(dt, puck, action)
     
+    def is_out_of_bounds(self, puck: Puck) -> bool:
+        return abs(puck.pos) > self.config.boundary_radius
+
     def state(self, perspective: Puck):
         enemies = self.players.copy()
         enemies.remove(perspective)
-        assert len(enemies) == 1
-        enemy = enemies.pop()
+        assert len(enemies) >= 1
+        # State only has room for one opponent, in free-for-all arenas bots see the closest one
+        enemy = min(enemies, key=perspective.distance_to)
         return State(perspective.pos, perspective.vel, enemy.pos, enemy.vel)
+
+    def write_observation(self, perspective: Puck, buffer, capacity: int) -> int:
+        '''
+        Writes what perspective sees straight into buffer, usually the observation buffer in a bot's linear memory,
+        without building a State first. Enemies are written closest first, at most capacity of them.
+        Returns the number of enemies written.
+        '''
+        enemies = [p for p in self.players if p is not perspective]
+        enemies.sort(key=perspective.distance_to)
+        del enemies[capacity:]
+
+        values = [len(enemies), perspective.pos.real, perspective.pos.imag, perspective.vel.real, perspective.vel.imag]
+
+        for enemy in enemies:
+            values += enemy.pos.real, enemy.pos.imag, enemy.vel.real, enemy.vel.imag
+
+        _observation_struct(len(enemies)).pack_into(buffer, OBSERVATION_COUNT_OFFSET, *values)
+        return len(enemies)
+
+
+def start_positions(seed: Optional[int] = None) -> Tuple[complex, complex]:
+    '''
+    Mirrored start positions of a 1v1 match. Without a seed the pucks start on the x axis,
+    otherwise the line between them is rotated by a random angle derived from the seed.
+    '''
+    if seed is None:
+        return complex(-0.3, 0), complex(0.3, 0)
+
+    offset = cmath.rect(0.3, random.Random(seed).uniform(0, 2 * math.pi))
+    return -offset, offset
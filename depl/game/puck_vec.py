@@ -0,0 +1,229 @@
+'''
+Vectorized puck physics that steps many pucks in many independent environments at once.
+Mirrors depl.game.puck, which stays the reference implementation.
+'''
+
+from __future__ import annotations
+from typing import * # pyright: ignore[reportWildcardImportFromLibrary]
+import numpy as np
+
+from depl.game.puck import Config, State, Environment, Puck, EPS
+
+
+def _div(z: np.ndarray, x: np.ndarray) -> np.ndarray:
+    '''
+    Divides complex z by real x per component. numpy's complex division multiplies by the reciprocal
+    which is off by an ulp compared to Python's complex arithmetic.
+    '''
+    out = np.empty_like(z)
+    out.real = z.real / x
+    out.imag = z.imag / x
+    return out
+
+
+def _abs(z: np.ndarray) -> np.ndarray:
+    '''
+    Magnitude of complex z. np.abs uses its own algorithm which doesn't always round like Python's abs.
+    '''
+    return np.hypot(z.real, z.imag)
+
+
+class VecEnvironment:
+    '''
+    Structure of arrays version of puck.Environment. pos and vel are complex arrays of shape (envs, pucks),
+    every row is an independent environment sharing the same config and puck count.
+
+    Like the reference, collisions are resolved one pair after another, so a puck touching several others sees
+    the velocities of the pairs before it. Only the environments are vectorized, the pairs are a Python loop.
+    '''
+    def __init__(self, pos: np.ndarray, vel: Optional[np.ndarray] = None, config: Config = Config()):
+        self.pos: np.ndarray = np.array(pos, dtype=np.complex128, ndmin=2)
+        self.vel: np.ndarray = np.zeros_like(self.pos) if vel is None else np.array(vel, dtype=np.complex128, ndmin=2)
+        self.config: Config = config
+
+        assert self.pos.shape == self.vel.shape
+
+        self._pair_a, self._pair_b = np.triu_indices(self.n_pucks, 1)
+
+    @staticmethod
+    def from_environments(envs: List[Environment]) -> VecEnvironment:
+        assert len({len(env.players) for env in envs}) == 1
+        assert all(env.config == envs[0].config for env in envs)
+
+        pos = [[p.pos for p in env.players] for env in envs]
+        vel = [[p.vel for p in env.players] for env in envs]
+
+        return VecEnvironment(np.array(pos), np.array(vel), envs[0].config)
+
+    def to_environments(self) -> List[Environment]:
+        return [Environment([Puck(complex(p), complex(v)) for p, v in zip(pos, vel)], self.config)
+                for pos, vel in zip(self.pos, self.vel)]
+
+    @property
+    def n_envs(self) -> int:
+        return self.pos.shape[0]
+
+    @property
+    def n_pucks(self) -> int:
+        return self.pos.shape[1]
+
+    def collision_pairs(self) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        Candidate pairs (a, b) of puck indices that need to be checked for collisions
+        '''
+        return self._pair_a, self._pair_b
+
+    def resolve_collisions(self):
+        # same order as the reference, see broadphase.candidate_pairs
+        for a, b in zip(*self.collision_pairs()):
+            diff = self.pos[:, a] - self.pos[:, b]
+            dist = _abs(diff)
+            hit = (dist <= self.config.puck_radius * 2) & (dist >= EPS)
+
+            if not hit.any():
+                continue
+
+            env = np.nonzero(hit)[0]
+            n = _div(diff[env], dist[env])
+
+            v_rel = self.vel[env, a] - self.vel[env, b]
+            proj = v_rel.real * n.real + v_rel.imag * n.imag
+
+            # if moving apart, no collision response
+            approaching = proj < 0
+            env = env[approaching]
+            dv = proj[approaching] * n[approaching]
+
+            self.vel[env, a] -= dv
+            self.vel[env, b] += dv
+
+    def clamp_actions(self, actions: np.ndarray) -> np.ndarray:
+        actions = np.array(actions, dtype=np.complex128, ndmin=2)
+        mag = _abs(actions)
+        too_large = mag > self.config.max_puck_accel
+        actions[too_large] = _div(actions[too_large], mag[too_large]) * self.config.max_puck_accel
+
+        return actions
+
+    def update(self, dt: float, actions: np.ndarray):
+        '''
+        actions has the same shape as pos, the acceleration every puck wants to apply
+        '''
+        self.resolve_collisions()
+
+        # velocity update
+        self.pos += self.vel * dt
+        self.vel *= self.config.damping ** dt
+
+        # apply actions
+        self.vel += dt * self.clamp_actions(actions)
+
+    def out_of_bounds(self) -> np.ndarray:
+        return _abs(self.pos) > self.config.boundary_radius
+
+    def state(self, env: int, perspective: int) -> State:
+        assert self.n_pucks == 2
+        enemy = 1 - perspective
+
+        return State(complex(self.pos[env, perspective]), complex(self.vel[env, perspective]),
+                     complex(self.pos[env, enemy]), complex(self.vel[env, enemy]))
+
+
+class BatchEnvironment(VecEnvironment):
+    '''
+    K independent two player matches advanced together. A match is done once a puck leaves the arena or max_ticks
+    is reached. Finished matches are reset to the start positions if auto_reset is set, otherwise they stay done.
+    '''
+    def __init__(self, n_matches: int,
+                 config: Config = Config(),
+                 start_pos: Tuple[complex, complex] = (-0.3+0j, 0.3+0j),
+                 max_ticks: Optional[int] = None,
+                 auto_reset: bool = True):
+        self.start_pos = np.array(start_pos, dtype=np.complex128)
+        super().__init__(np.tile(self.start_pos, (n_matches, 1)), config=config)
+
+        self.max_ticks = max_ticks
+        self.auto_reset = auto_reset
+        self.ticks = np.zeros(n_matches, dtype=np.int64)
+        self.done = np.zeros(n_matches, dtype=bool)
+        self.winner = np.full(n_matches, -1, dtype=np.int8) # -1 for a draw or a running match
+        self.episodes = np.zeros(n_matches, dtype=np.int64)
+
+    def reset(self, mask: Optional[np.ndarray] = None):
+        if mask is None:
+            mask = np.ones(self.n_envs, dtype=bool)
+
+        self.pos[mask] = self.start_pos
+        self.vel[mask] = 0
+        self.ticks[mask] = 0
+        self.done[mask] = False
+        self.winner[mask] = -1
+
+    def update(self, dt: float, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        Advances all matches by dt, actions has shape (K, 2).
+        Returns which matches finished this tick together with their winner and tick count.
+        '''
+        running = ~self.done
+
+        super().update(dt, actions)
+        self.ticks[running] += 1
+
+        out = self.out_of_bounds()
+        finished = running & out.any(axis=1)
+
+        if self.max_ticks is not None:
+            finished |= running & (self.ticks >= self.max_ticks)
+
+        # exactly one puck out means the other one won, both out or the tick limit is a draw
+        self.winner[finished] = np.where(out[finished].sum(axis=1) == 1, np.argmin(out[finished], axis=1), -1)
+        self.done |= finished
+        self.episodes += finished
+
+        result = finished, self.winner.copy(), self.ticks.copy()
+
+        if self.auto_reset and finished.any():
+            self.reset(finished)
+
+        return result
+
+    def observations(self, perspective: int) -> np.ndarray:
+        '''
+        The State of every match from one player's view as float array of shape (K, 8), in the field order of State
+        '''
+        enemy = 1 - perspective
+        columns = (self.pos[:, perspective], self.vel[:, perspective], self.pos[:, enemy], self.vel[:, enemy])
+
+        return np.stack([part for c in columns for part in (c.real, c.imag)], axis=1)
+
+
+def max_deviation(reference: List[Environment], vec: VecEnvironment) -> float:
+    '''
+    Largest difference in position or velocity between reference environments and their vectorized counterpart
+    '''
+    pos = np.array([[p.pos for p in env.players] for env in reference])
+    vel = np.array([[p.vel for p in env.players] for env in reference])
+
+    return max(np.abs(pos - vec.pos).max(), np.abs(vel - vec.vel).max())
+
+
+if __name__ == "__main__":
+    # step random scenes with both implementations and report how far they drift apart
+    rng = np.random.default_rng(0)
+    config = Config()
+    dt = 1 / 60
+
+    for n_pucks in (2, 3, 8):
+        reference = [Environment([Puck(complex(*rng.uniform(-0.5, 0.5, 2)), complex(*rng.uniform(-0.5, 0.5, 2))) for _ in range(n_pucks)], config)
+                     for _ in range(64)]
+        vec = VecEnvironment.from_environments(reference)
+
+        for _ in range(600):
+            actions = rng.normal(size=vec.pos.shape) + 1j * rng.normal(size=vec.pos.shape)
+
+            for env, env_actions in zip(reference, actions):
+                env.update(dt, {p: complex(a) for p, a in zip(env.players, env_actions)})
+
+            vec.update(dt, actions)
+
+        print(f"{n_pucks} pucks: max deviation {max_deviation(reference, vec):.3g}")
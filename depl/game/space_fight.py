@@ -10,10 +10,16 @@ from enum import Enum, auto
 import math
 import cmath
 import itertools
-import util
+
+from depl.game import util
+from depl.game.barnes_hut import QuadTree
 
 EPS = 1e-5
 
+class GravityMode(Enum):
+    DIRECT = auto() # exact O(n^2) pairwise sum
+    BARNES_HUT = auto() # O(n log n) quadtree approximation, see barnes_hut_theta
+
 @dataclass(frozen=True)
 class SimConfig: 
     gravity_const: float = 1.0
@@ -24,6 +30,8 @@ class SimConfig:
     ship_vision_cone: float = math.radians(30) # 30 degrees in either direction
     ship_vision_reach: float = 0.5
     seed: Optional[int] = None
+    gravity_mode: GravityMode = GravityMode.DIRECT
+    barnes_hut_theta: float = 0.5 # opening angle, larger is faster but less accurate. 0 gives the exact sum
 
 class Action(Enum):
     FORWARD = auto()
@@ -133,6 +141,35 @@ class PhysicsSystem:
 
     def compute_attraction_force_magnitude(self, a: Body, b: Body) -> float:
         return (self.cfg.gravity_const * a.mass * b.mass) / max(a.distance_to(b), EPS)**2
+
+    def apply_gravity(self, bodies: List[Body]):
+        match self.cfg.gravity_mode:
+            case GravityMode.DIRECT: self._apply_gravity_direct(bodies)
+            case GravityMode.BARNES_HUT: self._apply_gravity_barnes_hut(bodies)
+
+    def _apply_gravity_direct(self, bodies: List[Body]):
+        '''
+        O(n^2) native implementation
+        '''
+        for a, b in itertools.combinations(bodies, 2):
+            force = self.compute_attraction_force_magnitude(a, b)
+            self.add_force(a, force * (b.pos - a.pos))
+            self.add_force(b, force * (a.pos - b.pos))
+
+    def _apply_gravity_barnes_hut(self, bodies: List[Body]):
+        '''
+        O(n log n) approximation, far away groups of bodies are treated as one body at their center of mass
+        '''
+        if len(bodies) < 2:
+            return
+
+        positions = [body.pos for body in bodies]
+        masses = [body.mass for body in bodies]
+        tree = QuadTree.build(positions, masses)
+
+        for i, body in enumerate(bodies):
+            attraction = tree.attraction(i, positions, masses, self.cfg.barnes_hut_theta)
+            self.add_force(body, self.cfg.gravity_const * body.mass * attraction)
     
     
 class Ship(Body):
@@ -154,13 +191,7 @@ class Game:
         self.phys = PhysicsSystem(cfg)
 
     def _process_gravity(self):
-        '''
-        O(n^2) native implementation
-        '''
-        for a, b in itertools.combinations(self.bodies, 2):
-            force = self.phys.compute_attraction_force_magnitude(a, b)
-            self.phys.add_force(a, force * (b.pos - a.pos))
-            self.phys.add_force(b, force * (a.pos - b.pos))
+        self.phys.apply_gravity(self.bodies)
 
     def _process_inputs(self, actions: Dict[Ship, Set[Action]]):
         for ship, action_set in actions.items():
@@ -0,0 +1,195 @@
+'''
+Glicko-2 ratings, see http://www.glicko.net/glicko/glicko2.pdf
+
+Unlike ELO every rating has a deviation that says how sure we are about it, which lets the tournament
+pick the matches that teach it the most and stop once the ranking is stable.
+'''
+
+from __future__ import annotations
+from typing import * # type: ignore
+from dataclasses import dataclass
+import itertools
+import math
+import random
+
+import config
+
+SCALE = 173.7178 # between the glicko and glicko-2 scales
+CONVERGENCE = 1e-6
+
+
+@dataclass(frozen=True)
+class Glicko2Rating:
+    rating: float = 1500.0
+    rd: float = 350.0 # rating deviation, roughly the standard deviation of rating
+    volatility: float = 0.06
+
+    @property
+    def mu(self) -> float:
+        return (self.rating - 1500) / SCALE
+
+    @property
+    def phi(self) -> float:
+        return self.rd / SCALE
+
+    @staticmethod
+    def from_glicko2(mu: float, phi: float, volatility: float) -> Glicko2Rating:
+        return Glicko2Rating(mu * SCALE + 1500, phi * SCALE, volatility)
+
+
+def _g(phi: float) -> float:
+    return 1 / math.sqrt(1 + 3 * phi**2 / math.pi**2)
+
+
+def _expected(mu: float, mu_opponent: float, phi_opponent: float) -> float:
+    return 1 / (1 + math.exp(-_g(phi_opponent) * (mu - mu_opponent)))
+
+
+def expected_score(a: Glicko2Rating, b: Glicko2Rating) -> float:
+    '''
+    Probability of a beating b, taking the uncertainty of both ratings into account
+    '''
+    return _expected(a.mu, b.mu, math.hypot(a.phi, b.phi))
+
+
+def rate(player: Glicko2Rating, results: Sequence[Tuple[Glicko2Rating, float]], tau: float = config.GLICKO_TAU) -> Glicko2Rating:
+    '''
+    Rating of player after one rating period with the given (opponent, score) results,
+    where the opponents' ratings are those from before the period and score is 1, 0.5 or 0
+    '''
+    mu, phi, sigma = player.mu, player.phi, player.volatility
+
+    if not results:
+        # a player that didn't play only becomes less certain
+        return Glicko2Rating.from_glicko2(mu, math.sqrt(phi**2 + sigma**2), sigma)
+
+    v_inv = 0.0
+    delta_sum = 0.0
+
+    for opponent, score in results:
+        g = _g(opponent.phi)
+        e = _expected(mu, opponent.mu, opponent.phi)
+        v_inv += g**2 * e * (1 - e)
+        delta_sum += g * (score - e)
+
+    v = 1 / v_inv
+    delta = v * delta_sum
+    sigma = _volatility(phi, sigma, v, delta, tau)
+
+    phi_star = math.sqrt(phi**2 + sigma**2)
+    phi = 1 / math.sqrt(1 / phi_star**2 + v_inv)
+    mu = mu + phi**2 * delta_sum
+
+    return Glicko2Rating.from_glicko2(mu, phi, sigma)
+
+
+def _volatility(phi: float, sigma: float, v: float, delta: float, tau: float) -> float:
+    # step 5 of the paper, the Illinois variant of regula falsi
+    a = math.log(sigma**2)
+
+    def f(x: float) -> float:
+        ex = math.exp(x)
+        return ex * (delta**2 - phi**2 - v - ex) / (2 * (phi**2 + v + ex)**2) - (x - a) / tau**2
+
+    lo = a
+
+    if delta**2 > phi**2 + v:
+        hi = math.log(delta**2 - phi**2 - v)
+    else:
+        k = 1
+        while f(a - k * tau) < 0:
+            k += 1
+        hi = a - k * tau
+
+    f_lo, f_hi = f(lo), f(hi)
+
+    while abs(hi - lo) > CONVERGENCE:
+        c = lo + (lo - hi) * f_lo / (f_hi - f_lo)
+        f_c = f(c)
+
+        if f_c * f_hi <= 0:
+            lo, f_lo = hi, f_hi
+        else:
+            f_lo /= 2
+
+        hi, f_hi = c, f_c
+
+    return math.exp(lo / 2)
+
+
+class RatingPeriod:
+    '''
+    Collects the results of a batch of matches. All of them are rated at once against the ratings from before the
+    period, so the order in which matches finish doesn't matter.
+    '''
+    def __init__(self):
+        self.results: Dict[str, List[Tuple[str, float]]] = {}
+
+    def add(self, player_a: str, player_b: str, winner: Optional[int]):
+        '''
+        winner is 0 for player_a, 1 for player_b and None for a draw, like in MatchResult
+        '''
+        score = 0.5 if winner is None else 1.0 - winner
+        self.results.setdefault(player_a, []).append((player_b, score))
+        self.results.setdefault(player_b, []).append((player_a, 1.0 - score))
+
+    def __len__(self) -> int:
+        return sum(len(results) for results in self.results.values()) // 2
+
+    def apply(self, ratings: Dict[str, Glicko2Rating], tau: float = config.GLICKO_TAU) -> Dict[str, Glicko2Rating]:
+        '''
+        Returns the ratings of all players after this period, including those that didn't play.
+        Players without a rating yet start from the default one, ratings itself is left unchanged.
+        '''
+        ratings = dict(ratings)
+
+        for player in self.results:
+            ratings.setdefault(player, Glicko2Rating())
+
+        return {player: rate(rating, [(ratings[opponent], score) for opponent, score in self.results.get(player, [])], tau)
+                for player, rating in ratings.items()}
+
+
+def information_gain(a: Glicko2Rating, b: Glicko2Rating) -> float:
+    '''
+    How much one match between a and b is expected to shrink the variance of both ratings.
+    Uncertain players and close matchups are the most informative.
+    '''
+    gain = 0.0
+
+    for player, opponent in ((a, b), (b, a)):
+        e = _expected(player.mu, opponent.mu, opponent.phi)
+        information = _g(opponent.phi)**2 * e * (1 - e)
+        gain += player.phi**2 - 1 / (1 / player.phi**2 + information)
+
+    return gain
+
+
+def pick_pairings(ratings: Dict[str, Glicko2Rating], played: Collection[FrozenSet[str]] = (),
+                  rng: Optional[random.Random] = None) -> List[Tuple[str, str]]:
+    '''
+    Greedily pairs every player at most once, starting with the pairings with the highest information gain.
+    Pairs that already met are only used if nothing else is left for them. Ties, like in the first period
+    where all ratings are equal, are broken randomly.
+    '''
+    players = list(ratings)
+    (rng or random).shuffle(players)
+
+    candidates = sorted(itertools.combinations(players, 2),
+                        key=lambda pair: (frozenset(pair) not in played, information_gain(ratings[pair[0]], ratings[pair[1]])),
+                        reverse=True)
+    paired: Set[str] = set()
+    pairings = []
+
+    for a, b in candidates:
+        if a in paired or b in paired:
+            continue
+
+        paired.update((a, b))
+        pairings.append((a, b))
+
+    return pairings
+
+
+def is_stable(ratings: Dict[str, Glicko2Rating], max_rd: float = config.GLICKO_STABLE_RD) -> bool:
+    return all(rating.rd <= max_rd for rating in ratings.values())
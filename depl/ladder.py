@@ -0,0 +1,204 @@
+'''
+Persistent ELO ladder that rates new bots incrementally instead of replaying a full round robin
+'''
+
+from __future__ import annotations
+from typing import * # type: ignore
+from dataclasses import dataclass, asdict
+import bisect
+import json
+import os
+import threading
+import time
+
+import config
+from depl.files import atomic_write
+from depl.matchmaker import MatchResult
+from depl.tournament import Pairing
+
+RATINGS = "ratings.json"
+HISTORY = "history.jsonl"
+
+
+@dataclass
+class Rating:
+    rating: float = config.LADDER_INITIAL_RATING
+    games: int = 0
+    wins: int = 0
+    draws: int = 0
+    losses: int = 0
+
+
+def expected_score(rating_a: float, rating_b: float) -> float:
+    return 1 / (1 + 10 ** ((rating_b - rating_a) / 400))
+
+
+class Ladder:
+    '''
+    Ratings of all active bots, updated after every match. Ratings are kept in memory and rewritten to disk after
+    every update, matches are appended to a history file. Players are identified by any string, e.g. bot digests.
+
+    rating(), rank() and leaderboard() only read precomputed state, so they are cheap enough to answer chat commands.
+    They can be called from other threads while a placement is running.
+    '''
+    def __init__(self, path: str = config.LADDER_PATH):
+        self.path = path
+        self.ratings: Dict[str, Rating] = {}
+        self._order: List[str] = [] # active players, best first
+        self._ranks: Dict[str, int] = {}
+        # ratings and the order derived from them only change together
+        self._lock = threading.Lock()
+
+        os.makedirs(self.path, exist_ok=True)
+
+        try:
+            with open(os.path.join(self.path, RATINGS)) as f:
+                self.ratings = {player: Rating(**rating) for player, rating in json.load(f).items()}
+        except FileNotFoundError:
+            pass
+
+        self._sort()
+
+    def rating(self, player: str) -> Optional[Rating]:
+        with self._lock:
+            return self.ratings.get(player)
+
+    def rank(self, player: str) -> Optional[int]:
+        '''
+        1 for the best player, None for unknown players
+        '''
+        with self._lock:
+            return self._ranks.get(player)
+
+    def leaderboard(self, n: Optional[int] = None) -> List[Tuple[str, Rating]]:
+        with self._lock:
+            return [(player, self.ratings[player]) for player in self._order[:n]]
+
+    def add(self, player: str, replaces: Optional[str] = None):
+        '''
+        Adds a player at the initial rating. A new version of a bot can start from the rating of the version it replaces,
+        which is retired, since it's likely to be about as strong.
+        '''
+        with self._lock:
+            if player in self.ratings:
+                return
+
+            rating = Rating()
+
+            if replaces is not None and replaces in self.ratings:
+                rating.rating = self.ratings[replaces].rating
+                del self.ratings[replaces]
+
+            self.ratings[player] = rating
+            self._save()
+
+    def retire(self, player: str):
+        with self._lock:
+            if self.ratings.pop(player, None) is not None:
+                self._save()
+
+    def record(self, pairing: Pairing, result: MatchResult):
+        '''
+        Updates the ratings of both players and appends the match to the history
+        '''
+        with self._lock:
+            a = self.ratings[pairing.player_a]
+            b = self.ratings[pairing.player_b]
+
+            match result.winner:
+                case 0:
+                    score = 1.0
+                    a.wins += 1
+                    b.losses += 1
+                case 1:
+                    score = 0.0
+                    a.losses += 1
+                    b.wins += 1
+                case _:
+                    score = 0.5
+                    a.draws += 1
+                    b.draws += 1
+
+            expected = expected_score(a.rating, b.rating)
+            a.rating += self._k(a) * (score - expected)
+            b.rating -= self._k(b) * (score - expected)
+            a.games += 1
+            b.games += 1
+
+            with open(os.path.join(self.path, HISTORY), "a") as f:
+                f.write(json.dumps({"time": time.time(), "a": pairing.player_a, "b": pairing.player_b,
+                                    "winner": result.winner, "reason": result.reason, "ticks": result.ticks,
+                                    "rating_a": a.rating, "rating_b": b.rating}) + "\n")
+
+            self._save()
+
+    def history(self) -> Generator[Dict[str, Any], None, None]:
+        try:
+            with open(os.path.join(self.path, HISTORY)) as f:
+                for line in f:
+                    yield json.loads(line)
+        except FileNotFoundError:
+            return
+
+    def neighbours(self, player: str, n: int, exclude: Collection[str] = ()) -> List[str]:
+        '''
+        The n other players whose ratings are closest to the rating of player
+        '''
+        with self._lock:
+            rating = self.ratings[player].rating
+            candidates = [p for p in self._order if p != player and p not in exclude]
+            # _order is sorted by descending rating, bisect on the negated ratings
+            i = bisect.bisect_left([-self.ratings[p].rating for p in candidates], -rating)
+            lo, hi = i, i
+            picked = []
+
+            while len(picked) < n and (lo > 0 or hi < len(candidates)):
+                below = candidates[hi] if hi < len(candidates) else None
+                above = candidates[lo - 1] if lo > 0 else None
+
+                if below is not None and (above is None or abs(self.ratings[below].rating - rating) <= abs(self.ratings[above].rating - rating)):
+                    picked.append(below)
+                    hi += 1
+                else:
+                    picked.append(above)
+                    lo -= 1
+
+            return picked
+
+    def place(self, player: str, play: Callable[[List[Pairing]], Iterable[Tuple[Pairing, MatchResult]]],
+              rounds: int = config.LADDER_PLACEMENT_ROUNDS,
+              opponents: int = config.LADDER_PLACEMENT_OPPONENTS):
+        '''
+        Rates a new player by playing it against the players rated closest to it, from both sides.
+        Every round picks new neighbours around the updated rating, so the bot moves towards its place on the ladder
+        with rounds * opponents * 2 matches instead of a match against everyone.
+        play runs the pairings and yields their results.
+        '''
+        self.add(player)
+        played: Set[str] = set()
+
+        for _ in range(rounds):
+            neighbours = self.neighbours(player, opponents, exclude=played)
+
+            if not neighbours:
+                break
+
+            played.update(neighbours)
+            pairings = [pairing for opponent in neighbours for pairing in (Pairing(player, opponent), Pairing(opponent, player))]
+
+            for pairing, result in play(pairings):
+                self.record(pairing, result)
+
+    def _k(self, rating: Rating) -> float:
+        # move quickly while the rating is still provisional
+        return config.LADDER_K * (2 if rating.games < config.LADDER_PROVISIONAL_GAMES else 1)
+
+    def _sort(self):
+        self._order = sorted(self.ratings, key=lambda p: self.ratings[p].rating, reverse=True)
+        self._ranks = {player: i + 1 for i, player in enumerate(self._order)}
+
+    def _save(self):
+        self._sort()
+
+        with atomic_write(os.path.join(self.path, RATINGS)) as f:
+            json.dump({player: asdict(rating) for player, rating in self.ratings.items()}, f)
@@ -1,13 +1,251 @@
+from typing import * # type: ignore
+from dataclasses import dataclass, field
+from pathlib import Path
+import logging
+import time
+import numpy as np
+import wasmtime
 
+import config
+from depl.deployer import BotSandbox, BudgetExceeded, MemoryLimitExceeded, SandboxStats
+from depl.game.puck import Config, Environment, Puck, State, start_positions
+from depl.game.puck_vec import BatchEnvironment
+from depl.profiler import Profiler, DISABLED, MATCH, SETUP, PHYSICS, REPLAY
+from depl.replay import Replay
+from depl.sandbox_pool import SandboxPool
 
-from deployer import BotSandbox
 
+SANDBOX_ERRORS = (wasmtime.WasmtimeError, wasmtime.Trap, BudgetExceeded)
 
+def forfeit_reason(e: Exception) -> str:
+    if isinstance(e, MemoryLimitExceeded):
+        return "memory limit"
+
+    return "timeout" if isinstance(e, BudgetExceeded) else "forfeit"
+
+
+@dataclass
+class MatchResult:
+    winner: Optional[int] # 0 for player_a, 1 for player_b, None for a draw
+    reason: str
+    ticks: int
+    setup_time: float # seconds spent loading and initializing the bots
+    elapsed: float # seconds spent simulating
+    replay: Optional[Replay] = None
+    replay_path: Optional[str] = None # where the replay was saved, if it was
+    bot_stats: List[SandboxStats] = field(default_factory=list)
+    profile: Optional[Profiler] = None # time per phase, if the match was profiled in another process
+    seed: Optional[int] = None # seed of the start positions, see start_positions
+
+    @property
+    def ticks_per_sec(self) -> float:
+        return self.ticks / self.elapsed if self.elapsed > 0 else float("inf")
 
 
 class Match:
-    def __init__(self, player_a: str, player_b: str):
+    '''
+    A single headless fight between two bots. The simulation runs with a fixed timestep as fast as possible,
+    a player loses once their puck leaves the arena.
+    '''
+    def __init__(self, player_a: str, player_b: str,
+                 game_config: Config = Config(),
+                 dt: float = config.MATCH_DT,
+                 max_ticks: int = config.MATCH_MAX_TICKS,
+                 seed: Optional[int] = None,
+                 record_replay: bool = False,
+                 pool: Optional[SandboxPool] = None,
+                 profiler: Profiler = DISABLED,
+                 logger=logging.Logger("dummy")):
         self.player_a = player_a
         self.player_b = player_b
+        self.game_config = game_config
+        self.dt = dt
+        self.max_ticks = max_ticks
+        self.seed = seed
+        self.record_replay = record_replay
+        self.pool = pool
+        self.profiler = profiler
+        self.logger = logger
+
+    def run(self) -> MatchResult:
+        return self.run_series([self.seed])[0]
+
+    def run_series(self, seeds: Iterable[Optional[int]]) -> List[MatchResult]:
+        '''
+        Plays one match per seed. The bots are only instantiated and initialized for the first match,
+        before every rematch they are reset to their state right after init.
+        With a pool the sandboxes are taken from and given back to it.
+        '''
+        seeds = list(seeds)
+        sandboxes: List[Optional[BotSandbox]] = [None, None]
+        results = []
+
+        try:
+            for seed in seeds:
+                with self.profiler.phase(MATCH):
+                    result = self._run(sandboxes, seed, snapshot=len(seeds) > 1)
+
+                if result.replay is not None:
+                    result.replay.winner = result.winner
+                    result.replay.reason = result.reason
+
+                results.append(result)
+        finally:
+            if self.pool is not None:
+                for sandbox in sandboxes:
+                    if sandbox is not None:
+                        # releasing resets the sandbox, which is setup of the next match paid in advance
+                        with self.profiler.phase(SETUP):
+                            self.pool.release(sandbox)
+
+        return results
+
+    def _run(self, sandboxes: List[Optional[BotSandbox]], seed: Optional[int], snapshot: bool) -> MatchResult:
+        start = time.perf_counter()
+
+        for i, path in enumerate((self.player_a, self.player_b)):
+            sandbox = sandboxes[i]
+
+            try:
+                with self.profiler.phase(SETUP):
+                    if sandbox is not None:
+                        sandbox.reset()
+                    elif self.pool is not None:
+                        sandboxes[i] = self.pool.acquire(path, self.game_config, self.logger, self.profiler)
+                    else:
+                        sandbox = BotSandbox(path, self.logger, profiler=self.profiler)
+                        sandbox.init(self.game_config, snapshot)
+                        sandboxes[i] = sandbox
+            except SANDBOX_ERRORS as e:
+                # start over with a fresh sandbox in the next match of the series
+                if sandbox is not None and self.pool is not None:
+                    self.pool.discard(sandbox)
+
+                sandboxes[i] = None
+                self.logger.error(f"{path} failed to start: {e}")
+                return MatchResult(1 - i, forfeit_reason(e), 0, time.perf_counter() - start, 0.0,
+                                   bot_stats=[sandbox.collect_stats() for sandbox in sandboxes[:i]], seed=seed)
+
+        result = self._play(sandboxes, seed, time.perf_counter() - start)
+        result.bot_stats = [sandbox.collect_stats() for sandbox in sandboxes]
+        result.seed = seed
+
+        return result
+
+    def _play(self, sandboxes: List[BotSandbox], seed: Optional[int], setup_time: float) -> MatchResult:
+        profiler = self.profiler
+        pucks = [Puck(pos=pos) for pos in start_positions(seed)]
+        env = Environment(pucks, self.game_config)
+        replay = None
+
+        if self.record_replay:
+            replay = Replay(self.game_config, self.dt, seed, (Path(self.player_a).name, Path(self.player_b).name))
+
+        start = time.perf_counter()
+
+        for tick in range(self.max_ticks):
+            actions = {}
+
+            for i, (sandbox, puck) in enumerate(zip(sandboxes, pucks)):
+                try:
+                    actions[puck] = sandbox.update_from(env, puck)
+                except SANDBOX_ERRORS as e:
+                    self.logger.error(f"{sandbox.path} crashed in tick {tick}: {e}")
+                    return MatchResult(1 - i, forfeit_reason(e), tick, setup_time, time.perf_counter() - start, replay)
+
+            if replay is not None:
+                profiler.start(REPLAY)
+                replay.record(actions[pucks[0]], actions[pucks[1]])
+                profiler.stop()
+
+            profiler.start(PHYSICS)
+            env.update(self.dt, actions)
+            out = [env.is_out_of_bounds(puck) for puck in pucks]
+            profiler.stop()
+
+            if all(out):
+                return MatchResult(None, "both out", tick + 1, setup_time, time.perf_counter() - start, replay)
+
+            if any(out):
+                return MatchResult(out.index(False), "ring out", tick + 1, setup_time, time.perf_counter() - start, replay)
+
+        return MatchResult(None, "tick limit", self.max_ticks, setup_time, time.perf_counter() - start, replay)
+
+
+class MatchBatch:
+    '''
+    Plays one bot against many opponents at once, the physics of all matches is stepped in a single BatchEnvironment.
+    The bot gets a fresh sandbox for every match so matches can't influence each other.
+    '''
+    def __init__(self, player: str, opponents: List[str],
+                 game_config: Config = Config(),
+                 dt: float = config.MATCH_DT,
+                 max_ticks: int = config.MATCH_MAX_TICKS,
+                 logger=logging.Logger("dummy")):
+        self.player = player
+        self.opponents = opponents
+        self.game_config = game_config
+        self.dt = dt
+        self.max_ticks = max_ticks
+        self.logger = logger
+
+    def run(self) -> List[MatchResult]:
+        start = time.perf_counter()
+        n = len(self.opponents)
+        env = BatchEnvironment(n, self.game_config, max_ticks=self.max_ticks, auto_reset=False)
+        reasons = [""] * n
+        sandboxes: List[List[Optional[BotSandbox]]] = [[None, None] for _ in range(n)]
+
+        for k, opponent in enumerate(self.opponents):
+            for i, path in enumerate((self.player, opponent)):
+                try:
+                    sandbox = BotSandbox(path, self.logger)
+                    sandbox.init(self.game_config)
+                except SANDBOX_ERRORS as e:
+                    self.logger.error(f"{path} failed to start: {e}")
+                    self._forfeit(env, reasons, k, i, forfeit_reason(e))
+                    break
+
+                sandboxes[k][i] = sandbox
+
+        setup_time = time.perf_counter() - start
+        start = time.perf_counter()
+        actions = [[0j, 0j] for _ in range(n)]
+        finished_at = [0.0] * n
+
+        while not env.done.all():
+            # convert to python complex numbers once per tick instead of once per bot
+            pos, vel = env.pos.tolist(), env.vel.tolist()
+
+            for k in np.flatnonzero(~env.done).tolist():
+                for i, sandbox in enumerate(sandboxes[k]):
+                    state = State(pos[k][i], vel[k][i], pos[k][1 - i], vel[k][1 - i])
+
+                    try:
+                        actions[k][i] = sandbox.update(state)
+                    except SANDBOX_ERRORS as e:
+                        self.logger.error(f"{sandbox.path} crashed in tick {env.ticks[k]}: {e}")
+                        self._forfeit(env, reasons, k, i, forfeit_reason(e))
+                        finished_at[k] = time.perf_counter() - start
+                        break
+
+            finished, winner, ticks = env.update(self.dt, actions)
+
+            for k in np.flatnonzero(finished):
+                out = env.out_of_bounds()[k]
+                reasons[k] = "both out" if out.all() else "ring out" if out.any() else "tick limit"
+                finished_at[k] = time.perf_counter() - start
+
+        return [MatchResult(None if env.winner[k] == -1 else int(env.winner[k]), reasons[k], int(env.ticks[k]), setup_time / n, finished_at[k],
+                            bot_stats=[sandbox.collect_stats() for sandbox in sandboxes[k] if sandbox is not None])
+                for k in range(n)]
+
+    def _forfeit(self, env: BatchEnvironment, reasons: List[str], match: int, loser: int, reason: str):
+        env.done[match] = True
+        env.winner[match] = 1 - loser
+        reasons[match] = reason
+
 
-        
\ No newline at end of file
+if __name__ == "__main__":
+    result = Match("c/simple_rammer.wasm", "c/simple_rammer.wasm").run()
+    print(result, f"{result.ticks_per_sec:.0f} ticks/s")
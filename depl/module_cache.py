@@ -0,0 +1,133 @@
+'''
+Persistent cache of compiled WASM modules
+'''
+
+from typing import * # type: ignore
+from dataclasses import dataclass
+import hashlib
+import importlib.metadata
+import os
+import time
+import wasmtime
+
+import config
+from depl.files import atomic_write
+
+
+WASMTIME_VERSION = importlib.metadata.version("wasmtime")
+SUFFIX = ".cwasm"
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    compile_time: float = 0.0 # seconds spent compiling on misses
+    load_time: float = 0.0 # seconds spent deserializing on hits
+
+
+class ModuleCache:
+    '''
+    Stores serialized compiled modules on disk so that every submission is only compiled once.
+    Entries are keyed by the SHA-256 of the wasm bytes, the wasmtime version and the engine configuration,
+    since serialized modules can only be loaded by a compatible engine.
+    The least recently used entries are evicted once the cache grows beyond max_bytes.
+
+    Only ever point this at a directory the host controls: deserialized modules are trusted native code.
+    '''
+    def __init__(self, path: str = config.MODULE_CACHE_PATH, max_bytes: int = config.MODULE_CACHE_MAX_BYTES, engine_tag: str = "default"):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.engine_tag = engine_tag
+        self.stats = CacheStats()
+
+        os.makedirs(self.path, exist_ok=True)
+
+    def key(self, wasm: bytes, engine_tag: Optional[str] = None) -> str:
+        h = hashlib.sha256(wasm)
+        h.update(b"\0" + WASMTIME_VERSION.encode())
+        h.update(b"\0" + (engine_tag or self.engine_tag).encode())
+        return h.hexdigest()
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.path, key + SUFFIX)
+
+    def load(self, engine: wasmtime.Engine, path: str, engine_tag: Optional[str] = None) -> wasmtime.Module:
+        '''
+        Returns the compiled module for the wasm file at path, compiling and caching it on a miss.
+        engine_tag has to describe the configuration of engine if it differs from the cache's default.
+        '''
+        with open(path, "rb") as f:
+            wasm = f.read()
+
+        return self.load_bytes(engine, wasm, engine_tag)
+
+    def load_bytes(self, engine: wasmtime.Engine, wasm: bytes, engine_tag: Optional[str] = None) -> wasmtime.Module:
+        entry = self.entry_path(self.key(wasm, engine_tag))
+
+        if os.path.exists(entry):
+            start = time.perf_counter()
+            try:
+                module = wasmtime.Module.deserialize_file(engine, entry)
+            except wasmtime.WasmtimeError:
+                # incompatible or corrupted entry, drop it and recompile
+                self._remove(entry)
+            else:
+                self.stats.hits += 1
+                self.stats.load_time += time.perf_counter() - start
+                os.utime(entry) # mark as recently used
+                return module
+
+        self.stats.misses += 1
+        start = time.perf_counter()
+        module = wasmtime.Module(engine, wasm)
+        self.stats.compile_time += time.perf_counter() - start
+
+        self._store(entry, module.serialize())
+        self.evict()
+
+        return module
+
+    def evict(self):
+        '''
+        Removes least recently used entries until the cache fits into max_bytes.
+        '''
+        entries = []
+        for name in os.listdir(self.path):
+            if not name.endswith(SUFFIX):
+                continue
+
+            try:
+                st = os.stat(os.path.join(self.path, name))
+            except FileNotFoundError: # removed by another worker
+                continue
+
+            entries.append((st.st_mtime, st.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        entries.sort()
+
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+
+            self._remove(os.path.join(self.path, name))
+            self.stats.evictions += 1
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            if name.endswith(SUFFIX):
+                self._remove(os.path.join(self.path, name))
+
+    def _store(self, entry: str, data: bytes):
+        # concurrent workers never see a partial entry
+        with atomic_write(entry, "wb") as f:
+            f.write(data)
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,125 @@
+'''
+Opt-in profiling of where the time of a match goes
+'''
+
+from __future__ import annotations
+from typing import * # type: ignore
+from contextlib import contextmanager, nullcontext
+import json
+import time
+
+# phases recorded by the match runner and BotSandbox
+MATCH = "match"
+SETUP = "setup"
+COMPILE = "compile"
+INSTANTIATE = "instantiate"
+INIT = "init"
+UPDATE = "update"
+HOST_CALLBACKS = "host callbacks"
+PHYSICS = "physics"
+REPLAY = "replay"
+
+
+class Profiler:
+    '''
+    Cumulative wall time and number of calls per phase. Phases nest, e.g. host callbacks are timed inside the update
+    call that made them, and every stack of phases is accounted separately like in a sampling profiler.
+    A disabled profiler ignores all calls, so instrumented code never has to check whether profiling is on.
+    Profiles are plain data, so those of worker processes can be sent back and merged.
+    '''
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.totals: Dict[Tuple[str, ...], float] = {} # stack of phases -> seconds, including nested phases
+        self.calls: Dict[Tuple[str, ...], int] = {}
+        self._stack: Tuple[str, ...] = ()
+        self._starts: List[float] = []
+
+    def start(self, phase: str):
+        if not self.enabled:
+            return
+
+        self._stack += (phase,)
+        self._starts.append(time.perf_counter())
+
+    def stop(self):
+        if not self.enabled:
+            return
+
+        elapsed = time.perf_counter() - self._starts.pop()
+        stack = self._stack
+        self.totals[stack] = self.totals.get(stack, 0.0) + elapsed
+        self.calls[stack] = self.calls.get(stack, 0) + 1
+        self._stack = stack[:-1]
+
+    def phase(self, phase: str) -> ContextManager:
+        return self._phase(phase) if self.enabled else nullcontext()
+
+    @contextmanager
+    def _phase(self, phase: str) -> Generator[None, None, None]:
+        self.start(phase)
+
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def merge(self, other: Profiler):
+        for stack, seconds in other.totals.items():
+            self.totals[stack] = self.totals.get(stack, 0.0) + seconds
+            self.calls[stack] = self.calls.get(stack, 0) + other.calls[stack]
+
+    def self_times(self) -> Dict[Tuple[str, ...], float]:
+        '''
+        Time spent in every stack of phases excluding the phases nested in it
+        '''
+        times = dict(self.totals)
+
+        for stack, seconds in self.totals.items():
+            if len(stack) > 1 and stack[:-1] in times:
+                times[stack[:-1]] -= seconds
+
+        return times
+
+    def phases(self) -> Dict[str, Tuple[float, int]]:
+        '''
+        Total seconds and calls per phase, no matter where it was nested
+        '''
+        phases: Dict[str, Tuple[float, int]] = {}
+
+        for stack, seconds in self.totals.items():
+            # a phase nested in itself would be counted twice
+            if stack[-1] in stack[:-1]:
+                continue
+
+            total, calls = phases.get(stack[-1], (0.0, 0))
+            phases[stack[-1]] = total + seconds, calls + self.calls[stack]
+
+        return phases
+
+    def to_json(self) -> Dict[str, Any]:
+        self_times = self.self_times()
+
+        return {
+            "phases": {phase: {"seconds": seconds, "calls": calls} for phase, (seconds, calls) in self.phases().items()},
+            "stacks": [{"stack": list(stack), "seconds": seconds, "self_seconds": self_times[stack], "calls": self.calls[stack]}
+                       for stack, seconds in self.totals.items()],
+        }
+
+    def save_json(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_json(), f, indent=2)
+
+    def collapsed(self) -> str:
+        '''
+        Self time per stack in microseconds in the collapsed stack format of flamegraph.pl and speedscope
+        '''
+        lines = [f"{';'.join(stack)} {round(seconds * 1e6)}" for stack, seconds in sorted(self.self_times().items())]
+        return "\n".join(line for line in lines if not line.endswith(" 0")) + "\n"
+
+    def save_collapsed(self, path: str):
+        with open(path, "w") as f:
+            f.write(self.collapsed())
+
+
+# default of everything that can be profiled
+DISABLED = Profiler(enabled=False)
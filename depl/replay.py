@@ -0,0 +1,166 @@
+'''
+Compact binary replays. The simulation is deterministic, so a replay only stores the config, the seed
+and the actions of both bots for every tick, and re-simulates the match from those.
+
+Layout (little endian):
+    magic "SCRP", version u8, flags u8, then the body, zlib compressed if FLAG_ZLIB is set
+    body: config 4 f64, dt f64, seed i64, has seed u8, winner i8, ticks u32,
+          reason, player a, player b as u8 length + utf-8,
+          actions as varints, see encode_actions
+'''
+
+from __future__ import annotations
+from typing import * # type: ignore
+from array import array
+from dataclasses import dataclass, field, astuple
+import struct
+import zlib
+
+from depl.game.puck import Config, Environment, Puck, start_positions
+
+MAGIC = b"SCRP"
+VERSION = 1
+FLAG_ZLIB = 1
+
+_PREFIX = struct.Struct("<4sBB")
+_HEADER = struct.Struct("<4ddqBbI")
+
+# actions per tick: x and y acceleration of both pucks
+ACTION_WIDTH = 4
+
+
+@dataclass
+class Replay:
+    config: Config
+    dt: float
+    seed: Optional[int] = None
+    players: Tuple[str, str] = ("", "")
+    winner: Optional[int] = None
+    reason: str = ""
+    actions: array = field(default_factory=lambda: array("f")) # ACTION_WIDTH f32 per tick
+
+    @property
+    def ticks(self) -> int:
+        return len(self.actions) // ACTION_WIDTH
+
+    def record(self, a: complex, b: complex):
+        '''
+        Appends the actions of one tick. Cheap enough to call from the simulation loop, all encoding happens in encode().
+        '''
+        self.actions.extend((a.real, a.imag, b.real, b.imag))
+
+    def action(self, tick: int) -> Tuple[complex, complex]:
+        x_a, y_a, x_b, y_b = self.actions[tick * ACTION_WIDTH:(tick + 1) * ACTION_WIDTH]
+        return complex(x_a, y_a), complex(x_b, y_b)
+
+    def encode(self, compress: bool = True) -> bytes:
+        body = bytearray(_HEADER.pack(*astuple(self.config), self.dt,
+                                      self.seed or 0, self.seed is not None,
+                                      -1 if self.winner is None else self.winner,
+                                      self.ticks))
+
+        for s in (self.reason, *self.players):
+            raw = s.encode()[:255]
+            body.append(len(raw))
+            body += raw
+
+        body += encode_actions(self.actions)
+
+        if compress:
+            return _PREFIX.pack(MAGIC, VERSION, FLAG_ZLIB) + zlib.compress(body, 9)
+
+        return _PREFIX.pack(MAGIC, VERSION, 0) + bytes(body)
+
+    @staticmethod
+    def decode(data: bytes) -> Replay:
+        magic, version, flags = _PREFIX.unpack_from(data)
+
+        if magic != MAGIC:
+            raise ValueError("not a replay file")
+
+        if version != VERSION:
+            raise ValueError(f"unsupported replay version {version}")
+
+        body = memoryview(data)[_PREFIX.size:]
+        if flags & FLAG_ZLIB:
+            body = memoryview(zlib.decompress(body))
+
+        *config, dt, seed, has_seed, winner, ticks = _HEADER.unpack_from(body)
+        offset = _HEADER.size
+
+        strings = []
+        for _ in range(3):
+            length = body[offset]
+            strings.append(bytes(body[offset + 1:offset + 1 + length]).decode())
+            offset += 1 + length
+
+        reason, player_a, player_b = strings
+        actions = decode_actions(body[offset:], ticks * ACTION_WIDTH)
+
+        return Replay(Config(*config), dt, seed if has_seed else None, (player_a, player_b),
+                      None if winner == -1 else winner, reason, actions)
+
+    def save(self, path: str, compress: bool = True):
+        with open(path, "wb") as f:
+            f.write(self.encode(compress))
+
+    @staticmethod
+    def load(path: str) -> Replay:
+        with open(path, "rb") as f:
+            return Replay.decode(f.read())
+
+    def simulate(self) -> Generator[Environment, None, None]:
+        '''
+        Re-simulates the match, yields the environment after every tick
+        '''
+        pucks = [Puck(pos) for pos in start_positions(self.seed)]
+        env = Environment(pucks, self.config)
+
+        for tick in range(self.ticks):
+            a, b = self.action(tick)
+            env.update(self.dt, {pucks[0]: a, pucks[1]: b})
+            yield env
+
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_actions(actions: array) -> bytes:
+    '''
+    Every f32 is XORed with the same component of the previous tick and written as varint.
+    Bots tend to repeat or only slightly change their actions, which turns into zeros or short varints.
+    '''
+    bits = array("I", actions.tobytes())
+    assert bits.itemsize == 4
+    out = bytearray()
+
+    for i, value in enumerate(bits):
+        _write_varint(out, value ^ bits[i - ACTION_WIDTH] if i >= ACTION_WIDTH else value)
+
+    return bytes(out)
+
+
+def decode_actions(data: memoryview, count: int) -> array:
+    bits = array("I", bytes(4 * count))
+    offset = 0
+
+    for i in range(count):
+        value = 0
+        shift = 0
+
+        while True:
+            byte = data[offset]
+            offset += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+
+            if byte < 0x80:
+                break
+
+        bits[i] = value ^ bits[i - ACTION_WIDTH] if i >= ACTION_WIDTH else value
+
+    return array("f", bits.tobytes())
@@ -0,0 +1,172 @@
+'''
+SQLite database of match results
+'''
+
+from typing import * # type: ignore
+from dataclasses import dataclass, astuple
+import json
+import sqlite3
+import time
+
+import config
+from depl.game.puck import Config
+from depl.matchmaker import MatchResult
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS matches (
+    id INTEGER PRIMARY KEY,
+    time REAL NOT NULL,
+    bot_a TEXT NOT NULL, -- SHA-256 of the wasm files
+    bot_b TEXT NOT NULL,
+    config TEXT NOT NULL, -- game config as a json list
+    dt REAL NOT NULL,
+    seed INTEGER,
+    winner INTEGER, -- 0 for bot_a, 1 for bot_b, NULL for a draw
+    reason TEXT NOT NULL,
+    ticks INTEGER NOT NULL,
+    setup_time REAL NOT NULL,
+    elapsed REAL NOT NULL,
+    fuel_a INTEGER, -- NULL if the bot didn't start
+    fuel_b INTEGER,
+    max_tick_fuel_a INTEGER,
+    max_tick_fuel_b INTEGER,
+    skipped_ticks_a INTEGER,
+    skipped_ticks_b INTEGER,
+    peak_memory_a INTEGER,
+    peak_memory_b INTEGER,
+    replay TEXT -- path of the replay file, if one was recorded
+);
+CREATE INDEX IF NOT EXISTS matches_pair ON matches (bot_a, bot_b);
+CREATE INDEX IF NOT EXISTS matches_a_time ON matches (bot_a, time);
+CREATE INDEX IF NOT EXISTS matches_b_time ON matches (bot_b, time);
+
+-- totals per bot, kept up to date with every insert so the leaderboard never scans matches
+CREATE TABLE IF NOT EXISTS bots (
+    bot TEXT PRIMARY KEY,
+    games INTEGER NOT NULL DEFAULT 0,
+    wins INTEGER NOT NULL DEFAULT 0,
+    draws INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0,
+    points REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS bots_points ON bots (points);
+'''
+
+_INSERT_MATCH = f"INSERT INTO matches VALUES (NULL, {', '.join('?' * 20)})"
+_UPSERT_BOT = '''
+INSERT INTO bots (bot, games, wins, draws, losses, points) VALUES (?, 1, ?, ?, ?, ?)
+ON CONFLICT (bot) DO UPDATE SET
+    games = games + 1,
+    wins = wins + excluded.wins,
+    draws = draws + excluded.draws,
+    losses = losses + excluded.losses,
+    points = points + excluded.points
+'''
+
+
+@dataclass
+class HeadToHead:
+    wins_a: int
+    wins_b: int
+    draws: int
+
+
+class ResultsDB:
+    '''
+    Match results in WAL mode, so readers never block the writer. Results are buffered and inserted in batches of
+    batch_size, one transaction each, which is what makes thousands of inserts per second possible.
+    There should only be one writer, e.g. the process that collects the results of the tournament workers.
+    Call flush() or close() to write the rest of the buffer.
+    '''
+    def __init__(self, path: str = config.RESULTS_DB_PATH, batch_size: int = config.RESULTS_DB_BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self._matches: List[tuple] = []
+        self._bots: List[tuple] = []
+        # all results of a tournament share one config, only serialize it when it changes
+        self._config: Optional[Config] = None
+        self._config_json = ""
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # a crash can lose the last transactions but never corrupts the database in WAL mode
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("PRAGMA busy_timeout=5000")
+        self.connection.executescript(SCHEMA)
+
+    def add(self, bot_a: str, bot_b: str, result: MatchResult, game_config: Config, dt: float,
+            seed: Optional[int] = None, replay: Optional[str] = None):
+        stats = [(s.fuel_used, s.max_tick_fuel, s.skipped_ticks, s.peak_memory_bytes) for s in result.bot_stats]
+        stats += [(None, None, None, None)] * (2 - len(stats))
+        (fuel_a, max_a, skipped_a, memory_a), (fuel_b, max_b, skipped_b, memory_b) = stats
+
+        if game_config is not self._config:
+            self._config = game_config
+            self._config_json = json.dumps(astuple(game_config))
+
+        self._matches.append((time.time(), bot_a, bot_b, self._config_json, dt, seed,
+                              result.winner, result.reason, result.ticks, result.setup_time, result.elapsed,
+                              fuel_a, fuel_b, max_a, max_b, skipped_a, skipped_b, memory_a, memory_b, replay))
+
+        for bot, side in ((bot_a, 0), (bot_b, 1)):
+            win = int(result.winner == side)
+            draw = int(result.winner is None)
+            loss = int(result.winner == 1 - side)
+            self._bots.append((bot, win, draw, loss, win + 0.5 * draw))
+
+        if len(self._matches) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._matches:
+            return
+
+        with self.connection:
+            self.connection.executemany(_INSERT_MATCH, self._matches)
+            self.connection.executemany(_UPSERT_BOT, self._bots)
+
+        self._matches.clear()
+        self._bots.clear()
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def head_to_head(self, bot_a: str, bot_b: str) -> HeadToHead:
+        wins_a, wins_b, draws = self.connection.execute('''
+            SELECT
+                COALESCE(SUM((bot_a = :a AND winner = 0) OR (bot_b = :a AND winner = 1)), 0),
+                COALESCE(SUM((bot_a = :b AND winner = 0) OR (bot_b = :b AND winner = 1)), 0),
+                COALESCE(SUM(winner IS NULL), 0)
+            FROM matches
+            WHERE (bot_a = :a AND bot_b = :b) OR (bot_a = :b AND bot_b = :a)
+        ''', {"a": bot_a, "b": bot_b}).fetchone()
+
+        return HeadToHead(wins_a, wins_b, draws)
+
+    def history(self, bot: str, limit: int = 20) -> List[sqlite3.Row]:
+        '''
+        The most recent matches of bot, newest first
+        '''
+        cursor = self.connection.execute('''
+            SELECT * FROM (SELECT * FROM matches WHERE bot_a = :bot ORDER BY time DESC LIMIT :limit)
+            UNION ALL
+            SELECT * FROM (SELECT * FROM matches WHERE bot_b = :bot ORDER BY time DESC LIMIT :limit)
+            ORDER BY time DESC LIMIT :limit
+        ''', {"bot": bot, "limit": limit})
+        cursor.row_factory = sqlite3.Row
+
+        return cursor.fetchall()
+
+    def leaderboard(self, limit: int = 10) -> List[Tuple[str, int, int, int, int, float]]:
+        '''
+        (bot, games, wins, draws, losses, points) of the bots with the most points
+        '''
+        return self.connection.execute("SELECT bot, games, wins, draws, losses, points FROM bots ORDER BY points DESC LIMIT ?",
+                                       (limit,)).fetchall()
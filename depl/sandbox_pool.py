@@ -0,0 +1,157 @@
+'''
+Pool of warm sandboxes that are reused across matches
+'''
+
+from typing import * # type: ignore
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, astuple
+import hashlib
+import logging
+import os
+
+import config
+from depl.deployer import BotSandbox
+from depl.game.puck import Config
+from depl.profiler import Profiler, DISABLED
+
+
+@dataclass
+class PoolStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    failed_resets: int = 0
+
+
+class SandboxPool:
+    '''
+    Keeps up to per_bot initialized sandboxes for every submission, keyed by the SHA-256 of the wasm file and the game config.
+    Sandboxes are reset to their snapshot when they are released, so acquiring a warm one costs next to nothing.
+    Once the idle sandboxes hold more than max_bytes of memory, those of the least recently used submissions are dropped.
+    '''
+    def __init__(self, per_bot: int = config.SANDBOX_POOL_PER_BOT, max_bytes: int = config.SANDBOX_POOL_MAX_BYTES,
+                 logger=logging.Logger("dummy")):
+        self.per_bot = per_bot
+        self.max_bytes = max_bytes
+        self.logger = logger
+        self.stats = PoolStats()
+        self._idle: OrderedDict[Tuple, List[Tuple[BotSandbox, int]]] = OrderedDict() # sandbox and its footprint
+        self._idle_bytes = 0
+        self._leased: Dict[int, Tuple] = {} # id of a sandbox that is in use -> its key
+        self._hashes: Dict[str, Tuple[Tuple[int, int], str]] = {} # path -> (mtime, size), digest
+
+    def _hash(self, path: str) -> str:
+        st = os.stat(path)
+        version = st.st_mtime_ns, st.st_size
+        cached = self._hashes.get(path)
+
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+
+        self._hashes[path] = version, digest
+        return digest
+
+    def acquire(self, path: str, game_config: Config, logger=logging.Logger("dummy"), profiler: Profiler = DISABLED) -> BotSandbox:
+        '''
+        Returns an initialized sandbox for the bot at path, which has to be given back with release().
+        Raises the same errors as creating and initializing a BotSandbox.
+        '''
+        key = self._hash(path), astuple(game_config)
+        idle = self._idle.get(key)
+
+        if idle:
+            sandbox, footprint = idle.pop()
+            self._idle_bytes -= footprint
+            self._idle.move_to_end(key)
+            self.stats.hits += 1
+        else:
+            self.stats.misses += 1
+            sandbox = BotSandbox(path, logger, profiler=profiler)
+            sandbox.init(game_config, snapshot=True)
+
+        sandbox.logger = logger
+        sandbox.profiler = profiler
+        self._leased[id(sandbox)] = key
+        return sandbox
+
+    def release(self, sandbox: BotSandbox):
+        '''
+        Resets the sandbox and keeps it for the next match, unless resetting fails or there are enough idle ones already
+        '''
+        key = self._leased.pop(id(sandbox))
+        idle = self._idle.setdefault(key, [])
+        self._idle.move_to_end(key)
+
+        if len(idle) >= self.per_bot:
+            return
+
+        try:
+            sandbox.reset()
+        except Exception as e:
+            self.logger.error(f"Dropping sandbox of {sandbox.path}, it failed to reset: {e}")
+            self.stats.failed_resets += 1
+            return
+
+        footprint = sandbox.memory_footprint()
+        idle.append((sandbox, footprint))
+        self._idle_bytes += footprint
+        self.evict()
+
+    def discard(self, sandbox: BotSandbox):
+        '''
+        Gives back a sandbox that is broken and must not be reused
+        '''
+        del self._leased[id(sandbox)]
+
+    @contextmanager
+    def sandbox(self, path: str, game_config: Config, logger=logging.Logger("dummy")) -> Generator[BotSandbox, None, None]:
+        sandbox = self.acquire(path, game_config, logger)
+
+        try:
+            yield sandbox
+        finally:
+            self.release(sandbox)
+
+    def evict(self):
+        '''
+        Drops idle sandboxes of the least recently used submissions until the pool fits into max_bytes
+        '''
+        while self._idle_bytes > self.max_bytes and self._idle:
+            key, idle = next(iter(self._idle.items()))
+
+            if not idle:
+                del self._idle[key]
+                continue
+
+            _, footprint = idle.pop(0)
+            self._idle_bytes -= footprint
+            self.stats.evictions += 1
+
+    def clear(self):
+        self._idle.clear()
+        self._idle_bytes = 0
+
+    @property
+    def idle_bytes(self) -> int:
+        return self._idle_bytes
+
+    def __len__(self) -> int:
+        return sum(len(idle) for idle in self._idle.values())
+
+
+_sandbox_pool: Optional[SandboxPool] = None
+
+def get_sandbox_pool() -> SandboxPool:
+    '''
+    Returns the sandbox pool shared by all matches in this process
+    '''
+    global _sandbox_pool
+
+    if _sandbox_pool is None:
+        _sandbox_pool = SandboxPool()
+
+    return _sandbox_pool
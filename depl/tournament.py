@@ -0,0 +1,259 @@
+'''
+Tournament manager that schedules matches between all submissions in a folder
+'''
+
+from typing import * # type: ignore
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+import logging
+import os
+import random
+import uuid
+
+import config
+from depl import deployer
+from depl.bot_store import BotStore, file_digest
+from depl.game.puck import Config
+from depl.glicko2 import Glicko2Rating, RatingPeriod, is_stable, pick_pairings
+from depl.matchmaker import Match, MatchResult
+from depl.profiler import Profiler, DISABLED, REPLAY
+from depl.results_db import ResultsDB
+from depl.sandbox_pool import get_sandbox_pool
+
+
+@dataclass(frozen=True)
+class Pairing:
+    player_a: str
+    player_b: str
+
+
+def find_submissions(directory: str) -> List[str]:
+    return sorted(str(p) for p in Path(directory).glob("*.wasm"))
+
+
+def round_robin(players: List[str], both_sides: bool = True) -> List[Pairing]:
+    '''
+    Every player fights every other player, if both_sides is set once from each starting position.
+    '''
+    pairings = []
+
+    for i, a in enumerate(players):
+        for b in players[i + 1:]:
+            pairings.append(Pairing(a, b))
+
+            if both_sides:
+                pairings.append(Pairing(b, a))
+
+    return pairings
+
+
+def swiss_round(players: List[str], scores: Dict[str, float], played: Set[FrozenSet[str]], rng: random.Random) -> Tuple[List[Pairing], Optional[str]]:
+    '''
+    Pairs players with similar scores that haven't met yet. Returns the pairings and the player that gets a bye, if any.
+    '''
+    # shuffle first so that ties in score are broken randomly
+    order = players.copy()
+    rng.shuffle(order)
+    order.sort(key=lambda p: scores[p], reverse=True)
+
+    bye = None
+    if len(order) % 2 == 1:
+        # the lowest ranked player sits this round out
+        bye = order.pop()
+
+    pairings = []
+    while order:
+        a = order.pop(0)
+        # prefer the closest ranked opponent we haven't played yet, otherwise take a rematch
+        opponent = next((b for b in order if frozenset((a, b)) not in played), order[0])
+        order.remove(opponent)
+        pairings.append(Pairing(a, opponent))
+
+    return pairings, bye
+
+
+def _init_worker():
+    # compile the engine and linker once per worker rather than once per match
+    deployer.get_linker()
+
+
+def _play(pairing: Pairing, seed: int, game_config: Config, dt: float, max_ticks: int, replay_dir: Optional[str], profile: bool) -> MatchResult:
+    profiler = Profiler() if profile else DISABLED
+    # every worker keeps warm sandboxes of the bots it played, popular bots are set up only once per worker
+    match = Match(pairing.player_a, pairing.player_b, game_config, dt, max_ticks, seed,
+                  record_replay=replay_dir is not None, pool=get_sandbox_pool(), profiler=profiler)
+    result = match.run()
+
+    if result.replay is not None and replay_dir is not None:
+        # only send the path back to the main process
+        with profiler.phase(REPLAY):
+            result.replay_path = os.path.join(replay_dir, uuid.uuid4().hex + ".scrp")
+            result.replay.save(result.replay_path)
+            result.replay = None
+
+    if profile:
+        result.profile = profiler
+
+    return result
+
+
+class Tournament:
+    def __init__(self, players: List[str],
+                 workers: Optional[int] = None,
+                 game_config: Config = Config(),
+                 dt: float = config.MATCH_DT,
+                 max_ticks: int = config.MATCH_MAX_TICKS,
+                 seed: Optional[int] = None,
+                 db: Optional[ResultsDB] = None,
+                 replay_dir: Optional[str] = None,
+                 profiler: Profiler = DISABLED,
+                 logger=logging.Logger("dummy")):
+        self.players = players
+        self.workers = workers
+        self.game_config = game_config
+        self.dt = dt
+        self.max_ticks = max_ticks
+        self.rng = random.Random(seed)
+        self.db = db
+        self.replay_dir = replay_dir
+        # the phases of all matches are added up, see depl/profiler.py
+        self.profiler = profiler
+        self.logger = logger
+        self.scores: Dict[str, float] = {p: 0.0 for p in self.players}
+        self.played: Set[FrozenSet[str]] = set()
+        self.ratings: Dict[str, Glicko2Rating] = {p: Glicko2Rating() for p in self.players}
+        self.digests: Dict[str, str] = {p: file_digest(p) for p in self.players} if db is not None else {}
+
+        if replay_dir is not None:
+            os.makedirs(replay_dir, exist_ok=True)
+
+    def play(self, pairings: List[Pairing]) -> Generator[Tuple[Pairing, MatchResult], None, None]:
+        '''
+        Runs all pairings in a process pool and yields the results as soon as they complete.
+        '''
+        with self._pool() as pool:
+            yield from self._dispatch(pool, pairings)
+
+    @contextmanager
+    def session(self) -> Generator[Callable[[List[Pairing]], Iterator[Tuple[Pairing, MatchResult]]], None, None]:
+        '''
+        Yields a function that works like play(), but all its calls share one process pool,
+        so the workers keep their engines and sandboxes warm from one batch of pairings to the next
+        '''
+        with self._pool() as pool:
+            yield lambda pairings: self._dispatch(pool, pairings)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(self.workers, initializer=_init_worker)
+
+    def _dispatch(self, pool: ProcessPoolExecutor, pairings: List[Pairing]) -> Generator[Tuple[Pairing, MatchResult], None, None]:
+        # start positions are drawn in the main process, so the whole tournament can be reproduced from its seed
+        futures = {pool.submit(_play, pairing, self.rng.getrandbits(32), self.game_config, self.dt, self.max_ticks,
+                               self.replay_dir, self.profiler.enabled): pairing for pairing in pairings}
+
+        for future in as_completed(futures):
+            pairing = futures[future]
+
+            try:
+                result = future.result()
+            except Exception as e:
+                self.logger.error(f"{pairing} failed: {e}")
+                continue
+
+            self.record(pairing, result)
+            yield pairing, result
+
+        if self.db is not None:
+            self.db.flush()
+
+    def record(self, pairing: Pairing, result: MatchResult):
+        self.played.add(frozenset((pairing.player_a, pairing.player_b)))
+
+        if result.profile is not None:
+            self.profiler.merge(result.profile)
+            result.profile = None
+
+        if self.db is not None:
+            self.db.add(self.digests[pairing.player_a], self.digests[pairing.player_b], result,
+                        self.game_config, self.dt, result.seed, result.replay_path)
+
+        match result.winner:
+            case 0: self.scores[pairing.player_a] += 1.0
+            case 1: self.scores[pairing.player_b] += 1.0
+            case None:
+                self.scores[pairing.player_a] += 0.5
+                self.scores[pairing.player_b] += 0.5
+
+    def run_round_robin(self, both_sides: bool = True) -> Generator[Tuple[Pairing, MatchResult], None, None]:
+        yield from self.play(round_robin(self.players, both_sides))
+
+    def run_swiss(self, rounds: int) -> Generator[Tuple[Pairing, MatchResult], None, None]:
+        # keep the same workers for all rounds so their engines stay warm
+        with self._pool() as pool:
+            for _ in range(rounds):
+                pairings, bye = swiss_round(self.players, self.scores, self.played, self.rng)
+
+                if bye is not None:
+                    self.scores[bye] += 1.0
+
+                yield from self._dispatch(pool, pairings)
+
+    def run_glicko(self, max_periods: int = 50, both_sides: bool = True) -> Generator[Tuple[Pairing, MatchResult], None, None]:
+        '''
+        Rates the players with Glicko-2. Every rating period plays the pairings with the highest information gain,
+        which usually reaches a stable ranking with far fewer matches than a round robin.
+        '''
+        with self._pool() as pool:
+            for _ in range(max_periods):
+                if is_stable(self.ratings):
+                    break
+
+                pairings = []
+                for a, b in pick_pairings(self.ratings, self.played, self.rng):
+                    pairings.append(Pairing(a, b))
+
+                    if both_sides:
+                        pairings.append(Pairing(b, a))
+
+                if not pairings:
+                    break
+
+                period = RatingPeriod()
+
+                for pairing, result in self._dispatch(pool, pairings):
+                    period.add(pairing.player_a, pairing.player_b, result.winner)
+                    yield pairing, result
+
+                self.ratings = period.apply(self.ratings)
+
+    def standings(self) -> List[Tuple[str, float]]:
+        return sorted(self.scores.items(), key=lambda item: item[1], reverse=True)
+
+    def rating_standings(self) -> List[Tuple[str, Glicko2Rating]]:
+        return sorted(self.ratings.items(), key=lambda item: item[1].rating, reverse=True)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="round robin between all bots")
+    parser.add_argument("folder", nargs="?", help="folder of wasm files, all valid submissions if omitted")
+    parser.add_argument("--profile", metavar="PREFIX", help="write the time per phase to PREFIX.json and PREFIX.folded")
+    args = parser.parse_args()
+
+    players = find_submissions(args.folder) if args.folder else BotStore().paths()
+
+    with ResultsDB() as db:
+        tournament = Tournament(players, db=db, profiler=Profiler() if args.profile else DISABLED)
+
+        for pairing, result in tournament.run_round_robin():
+            print(f"{pairing.player_a} vs {pairing.player_b}: {result.winner} ({result.reason}, {result.ticks_per_sec:.0f} ticks/s)")
+
+    for player, score in tournament.standings():
+        print(f"{score:6.1f} {player}")
+
+    if args.profile:
+        tournament.profiler.save_json(args.profile + ".json")
+        tournament.profiler.save_collapsed(args.profile + ".folded")
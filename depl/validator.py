@@ -0,0 +1,297 @@
+'''
+Streaming validation of submitted wasm modules. The section headers are parsed while the module is still being
+downloaded, so oversized modules and modules with forbidden imports or missing exports are rejected before
+they are completely downloaded, let alone compiled.
+Only what is needed for these checks is parsed, wasmtime still validates the whole module when compiling it.
+'''
+
+from typing import * # type: ignore
+
+import config
+
+MAGIC = b"\0asm"
+VERSION = b"\1\0\0\0"
+
+SECTION_CUSTOM = 0
+SECTION_TYPE = 1
+SECTION_IMPORT = 2
+SECTION_FUNCTION = 3
+SECTION_MEMORY = 5
+SECTION_EXPORT = 7
+SECTION_DATA_COUNT = 12 # highest known section id
+# sections that are parsed, all others are skipped without being buffered
+PARSED_SECTIONS = (SECTION_TYPE, SECTION_IMPORT, SECTION_FUNCTION, SECTION_MEMORY, SECTION_EXPORT)
+
+KIND_FUNC = 0
+KIND_MEMORY = 2
+
+FUNC_TYPE = 0x60
+F32 = 0x7d
+
+Signature = Tuple[Tuple[int, ...], Tuple[int, ...]] # param types, result types
+
+### IF YOU MODIFY THESE THEN YOU MUST CHANGE BOT.H
+### ### ### ### ### ### ### ### ### ### ### ### ### ###
+HOST_IMPORTS: Dict[Tuple[str, str], Signature] = {
+    ("env", "send_action"): ((F32, F32), ()),
+    ("env", "set_color"): ((F32, F32, F32), ()),
+}
+
+REQUIRED_EXPORTS: Dict[str, Signature] = {
+    "init": ((F32,) * 4, ()),
+    "update": ((F32,) * 8, ()),
+}
+### ### ### ### ### ### ### ### ### ### ### ### ### ###
+
+# the WASI calls libc startup code needs. The sandbox has no files, so the fd calls only ever see empty stdio.
+# Clocks and random numbers are left out on purpose, bots have to be deterministic for replays
+WASI_MODULE = "wasi_snapshot_preview1"
+WASI_IMPORTS = {
+    "args_get", "args_sizes_get", "environ_get", "environ_sizes_get", "proc_exit", "sched_yield",
+    "fd_write", "fd_close", "fd_seek", "fd_fdstat_get", "fd_prestat_get", "fd_prestat_dir_name",
+}
+
+
+class ValidationError(Exception):
+    '''
+    Raised as soon as a submission turns out to be invalid
+    '''
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offset = 0
+
+    def byte(self) -> int:
+        if self.offset >= len(self.data):
+            raise ValidationError("section ends unexpectedly")
+
+        self.offset += 1
+        return self.data[self.offset - 1]
+
+    def u32(self) -> int:
+        value = 0
+
+        for shift in range(0, 35, 7):
+            byte = self.byte()
+            value |= (byte & 0x7f) << shift
+
+            if byte < 0x80:
+                return value
+
+        raise ValidationError("malformed integer")
+
+    def bytes(self, n: int) -> bytes:
+        if self.offset + n > len(self.data):
+            raise ValidationError("section ends unexpectedly")
+
+        self.offset += n
+        return self.data[self.offset - n:self.offset]
+
+    def name(self) -> str:
+        try:
+            return self.bytes(self.u32()).decode()
+        except UnicodeDecodeError:
+            raise ValidationError("malformed name")
+
+
+class WasmValidator:
+    '''
+    Feed the module in chunks of any size, then call finish(). Both raise ValidationError once the module is known to be invalid.
+    '''
+    def __init__(self, max_bytes: int = config.SUBMISSION_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.types: List[Signature] = []
+        self.functions: List[int] = [] # type index of every function, imported ones first
+        self.exports: Dict[str, Signature] = {}
+        self.memories = 0 # memories can't be imported, so these are all defined by the module
+        self.exported_memories: Set[int] = set()
+        self._buffer = bytearray()
+        self._header_done = False
+        self._section: Optional[int] = None # id of the section whose payload is being read
+        self._remaining = 0 # payload bytes of that section that are still missing
+        self._exports_checked = False
+
+    def feed(self, chunk: bytes):
+        self.size += len(chunk)
+
+        if self.size > self.max_bytes:
+            raise ValidationError(f"module is larger than {self.max_bytes} bytes")
+
+        self._buffer += chunk
+
+        while self._step():
+            pass
+
+    def finish(self):
+        if not self._header_done:
+            raise ValidationError("not a wasm module")
+
+        if self._section is not None or self._buffer:
+            raise ValidationError("module ends unexpectedly")
+
+        self._check_exports()
+
+    def _step(self) -> bool:
+        '''
+        Consumes as much of the buffer as possible, returns False once more data is needed
+        '''
+        if not self._header_done:
+            if len(self._buffer) < 8:
+                return False
+
+            if self._buffer[:4] != MAGIC or self._buffer[4:8] != VERSION:
+                raise ValidationError("not a wasm module")
+
+            del self._buffer[:8]
+            self._header_done = True
+            return True
+
+        if self._section is None:
+            header = self._section_header()
+
+            if header is None:
+                return False
+
+            self._section, self._remaining = header
+
+            if self._section > SECTION_DATA_COUNT:
+                raise ValidationError(f"unknown section {self._section}")
+
+            if self._section > SECTION_EXPORT:
+                # the sections come in order, so no exports can follow anymore
+                self._check_exports()
+
+            return True
+
+        if self._section in PARSED_SECTIONS:
+            if len(self._buffer) < self._remaining:
+                return False
+
+            payload = bytes(self._buffer[:self._remaining])
+            del self._buffer[:self._remaining]
+            self._parse(self._section, _Reader(payload))
+        else:
+            skipped = min(len(self._buffer), self._remaining)
+            del self._buffer[:skipped]
+            self._remaining -= skipped
+
+            if self._remaining > 0:
+                return False
+
+        self._section = None
+        return True
+
+    def _section_header(self) -> Optional[Tuple[int, int]]:
+        if not self._buffer:
+            return None
+
+        size = 0
+
+        for i, shift in enumerate(range(0, 35, 7), start=1):
+            if i >= len(self._buffer):
+                return None
+
+            byte = self._buffer[i]
+            size |= (byte & 0x7f) << shift
+
+            if byte < 0x80:
+                section = self._buffer[0]
+                del self._buffer[:i + 1]
+                return section, size
+
+        raise ValidationError("malformed section header")
+
+    def _parse(self, section: int, reader: _Reader):
+        if section == SECTION_TYPE:
+            for _ in range(reader.u32()):
+                if reader.byte() != FUNC_TYPE:
+                    raise ValidationError("malformed type section")
+
+                params = tuple(reader.bytes(reader.u32()))
+                results = tuple(reader.bytes(reader.u32()))
+                self.types.append((params, results))
+
+        elif section == SECTION_IMPORT:
+            for _ in range(reader.u32()):
+                module, name = reader.name(), reader.name()
+                kind = reader.byte()
+
+                if kind != KIND_FUNC:
+                    raise ValidationError(f"import {module}.{name} is not a function, only functions can be imported")
+
+                self.functions.append(reader.u32())
+                self._check_import(module, name, self._signature(self.functions[-1]))
+
+        elif section == SECTION_FUNCTION:
+            for _ in range(reader.u32()):
+                self.functions.append(reader.u32())
+
+        elif section == SECTION_MEMORY:
+            self.memories = reader.u32()
+
+        elif section == SECTION_EXPORT:
+            for _ in range(reader.u32()):
+                name = reader.name()
+                kind = reader.byte()
+                index = reader.u32()
+
+                if kind == KIND_FUNC:
+                    if index >= len(self.functions):
+                        raise ValidationError(f"export {name} refers to an unknown function")
+
+                    self.exports[name] = self._signature(self.functions[index])
+
+                elif kind == KIND_MEMORY:
+                    self.exported_memories.add(index)
+
+    def _signature(self, type_index: int) -> Signature:
+        if type_index >= len(self.types):
+            raise ValidationError("function refers to an unknown type")
+
+        return self.types[type_index]
+
+    def _check_import(self, module: str, name: str, signature: Signature):
+        if module == WASI_MODULE:
+            if name not in WASI_IMPORTS:
+                raise ValidationError(f"the WASI call {name} is not allowed")
+
+            return
+
+        expected = HOST_IMPORTS.get((module, name))
+
+        if expected is None:
+            raise ValidationError(f"import {module}.{name} is not allowed")
+
+        if signature != expected:
+            raise ValidationError(f"import {module}.{name} has the wrong signature")
+
+    def _check_exports(self):
+        if self._exports_checked:
+            return
+
+        for name, expected in REQUIRED_EXPORTS.items():
+            if name not in self.exports:
+                raise ValidationError(f"the function {name} has to be exported")
+
+            if self.exports[name] != expected:
+                raise ValidationError(f"the exported function {name} has the wrong signature")
+
+        # the sandbox can only see how far exported memories have grown, see BotSandbox._check_memory
+        for index in range(self.memories):
+            if index not in self.exported_memories:
+                raise ValidationError(f"memory {index} has to be exported")
+
+        self._exports_checked = True
+
+
+def validate_file(path: str, max_bytes: int = config.SUBMISSION_MAX_BYTES, chunk_size: int = 65536):
+    validator = WasmValidator(max_bytes)
+
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            validator.feed(chunk)
+
+    validator.finish()